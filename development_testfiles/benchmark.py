@@ -0,0 +1,211 @@
+# Benchmark suite for micropg_lite against the stand-in server in fake_server.py (or a real PostgreSQL server).
+#   python3 fake_server.py 5433 secret                  (CPython, in a second terminal)
+#   python3 benchmark.py [host] [port] [user] [password] [database]
+#   micropython benchmark.py ...                        (MicroPython unix port)
+# Reports per unit: time, throughput, network round trips and allocated memory (tracemalloc peak on CPython,
+# gc.mem_alloc() on MicroPython). The synthetic() result sets only exist on fake_server.py.
+# Stops first if importing the core module exceeds IMPORT_BUDGET or loads an optional module.
+
+import sys, time, gc
+sys.path.append('..')
+
+try: import tracemalloc
+except ImportError: tracemalloc = None
+
+# Import cost of the core module of micropg_lite 3.1.0, before the optional features were added, in bytes and ms:
+# tracemalloc peak on CPython, memory_test.py on MicroPython 1.27 (32-bit WASI build); the MicroPython ms figure is an
+# estimate for a 240 MHz ESP32, not a measurement.
+IMPORT_BASELINE = {'cpython': (1432486, 63), 'micropython': (8992, 400)}
+# Import budget of the core module, the optional features must stay out of it (micropg_lite_*.py). MicroPython may take
+# 2.5 times the baseline memory: measured 21664 bytes, 18384 bytes from the .mpy of build_mpy.py. CPython no more than the
+# baseline: measured 0.44 MB / 19 ms, 3.1.0 imported ssl and hashlib up front.
+IMPORT_BUDGET = {'cpython': IMPORT_BASELINE['cpython'], 'micropython': (IMPORT_BASELINE['micropython'][0] * 5 // 2, 400)}
+
+def ticks():
+    return time.ticks_us() if hasattr(time, 'ticks_us') else time.perf_counter_ns() // 1000
+
+def import_core():
+    # On CPython the budget is for loading the module, so its bytecode is brought up to date first.
+    # MicroPython compiles the source on every import unless the .mpy files of build_mpy.py are used.
+    try:
+        import py_compile
+        py_compile.compile('../micropg_lite.py')
+    except ImportError: pass
+    gc.collect()
+    if tracemalloc: tracemalloc.start()
+    else: before = gc.mem_alloc()
+    start = ticks()
+    import micropg_lite
+    elapsed = ticks() - start
+    if tracemalloc:
+        size = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    else: size = gc.mem_alloc() - before
+    loaded = [name for name in sys.modules if name.startswith('micropg_lite_')]
+    budget = IMPORT_BUDGET.get(sys.implementation.name)
+    baseline = IMPORT_BASELINE.get(sys.implementation.name)
+    print('import micropg_lite: %d bytes%s, %.1f ms, optional modules loaded: %s' % (
+        size, ' (%.2f times 3.1.0)' % (size / baseline[0]) if baseline else '', elapsed / 1000, loaded or 'none'))
+    if loaded or budget and (size > budget[0] or elapsed > budget[1] * 1000):
+        sys.exit('import budget exceeded: %d bytes / %d ms allowed' % budget)
+    return micropg_lite
+
+micropg_lite = import_core()
+
+args = sys.argv[1:] + [None] * 5
+HOST = args[0] or '127.0.0.1'
+PORT = int(args[1] or 5433)
+USER, PASSWORD, DATABASE = args[2] or 'postgres', args[3] or 'secret', args[4] or 'postgres'
+ROWS = 2000
+
+writes = [0]
+
+class CountingConnection(micropg_lite.connect):
+    # Every flush of the write buffer is one round trip, the client waits for the answer before it writes again
+    def _write(self, b):
+        writes[0] += 1
+        micropg_lite.connect._write(self, b)
+
+def connect(**kwargs):
+    return CountingConnection(HOST, USER, PASSWORD, DATABASE, port=PORT, **kwargs)
+
+def allocated(f):
+    # Bytes allocated while f() runs
+    if tracemalloc:
+        tracemalloc.start()
+        f()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+    gc.collect()
+    gc.disable()
+    before = gc.mem_alloc()
+    try: f()
+    finally:
+        after = gc.mem_alloc()
+        gc.enable()
+    return after - before
+
+def measure(label, f, units=1, unit='op', repeat=3):
+    # f() runs once for warm-up, then best of repeat for the time and once more for the allocations
+    f()
+    best, round_trips = None, 0
+    for _ in range(repeat):
+        writes[0] = 0
+        start = ticks()
+        f()
+        elapsed = ticks() - start
+        round_trips = writes[0]
+        best = elapsed if best is None or elapsed < best else best
+    alloc = allocated(f)
+    print('%-28s %10.3f ms %10d %-8s %8.2f %10d' % (label, best / 1000, units * 1000000 // max(best, 1), unit + '/s',
+                                                  round_trips / units, alloc // units))
+
+print('micropg_lite benchmark against %s:%d, %s' % (HOST, PORT, sys.implementation.name))
+print('%-28s %13s %19s %8s %10s' % ('', 'time', 'throughput', 'rt/unit', 'bytes/unit'))
+
+measure('connect (SCRAM)' if PASSWORD else 'connect', lambda: connect().close())
+
+conn = connect()
+cur = conn.cursor()
+
+def select(query, cursor=None):
+    def run():
+        c = cursor or cur
+        c.execute(query)
+        c.fetchall()
+    return run
+
+measure('select narrow', select("SELECT * FROM synthetic('narrow', %d)" % ROWS), ROWS, 'rows')
+measure('select wide (30 columns)', select("SELECT * FROM synthetic('wide', %d)" % (ROWS // 4)), ROWS // 4, 'rows')
+measure('select numeric', select("SELECT * FROM synthetic('numeric', %d)" % ROWS), ROWS, 'rows')
+measure('select numeric, stream', select("SELECT * FROM synthetic('numeric', %d)" % ROWS, conn.cursor(stream=200)), ROWS, 'rows')
+
+def select_lazy():
+    lazy = conn.cursor(lazy=True)
+    lazy.execute("SELECT * FROM synthetic('wide', %d)" % (ROWS // 4))
+    for row in lazy.fetchall(): row[0]
+measure('select wide, lazy 1 column', select_lazy, ROWS // 4, 'rows')
+
+def fetch_columns():
+    c = conn.cursor(stream=500)
+    c.execute("SELECT * FROM synthetic('numeric', %d)" % ROWS)
+    c.fetch_columns()
+measure('select numeric, columns', fetch_columns, ROWS, 'rows')
+
+binary = connect(binary=True)
+measure('select numeric, binary', select("SELECT * FROM synthetic('numeric', %d)" % ROWS, binary.cursor()), ROWS, 'rows')
+binary.close()
+
+# The cache only keeps SELECTs of tables, the call of synthetic() would make the result uncacheable
+cur.execute("DROP TABLE IF EXISTS bench_lookup")
+cur.execute("CREATE TABLE bench_lookup (id INTEGER, name TEXT)")
+cur.executemany("INSERT INTO bench_lookup VALUES (%s, %s)", [(i, 'sensor-%d' % i) for i in range(20)])
+conn.commit()
+cached = connect()
+cache = cached.cache_results()
+measure('select 20 rows', select("SELECT * FROM bench_lookup"), 1, 'query')
+measure('select 20 rows, cached', select("SELECT * FROM bench_lookup", cached.cursor()), 1, 'query')
+# Only the warm-up run may have gone to the server
+if cache.misses != 1 or not cache.hits: sys.exit('select 20 rows, cached: %d hits, %d misses' % (cache.hits, cache.misses))
+cached.close()
+cur.execute("DROP TABLE bench_lookup")
+conn.commit()
+
+cur.execute("DROP TABLE IF EXISTS bench")
+cur.execute("CREATE TABLE bench (id INTEGER, value REAL, name TEXT)")
+conn.commit()
+data = [(i, i * 0.25, 'sensor-%d' % (i % 10)) for i in range(ROWS)]
+
+def insert_commit():
+    for row in data[:100]:
+        cur.execute("INSERT INTO bench VALUES (%s, %s, %s)", row)
+        conn.commit()
+measure('insert + commit', insert_commit, 100, 'rows')
+
+def insert_many():
+    cur.executemany("INSERT INTO bench VALUES (%s, %s, %s)", data)
+    conn.commit()
+measure('executemany', insert_many, ROWS, 'rows')
+
+def copy_from():
+    cur.copy_from('bench', iter(data))
+    conn.commit()
+measure('copy_from', copy_from, ROWS, 'rows')
+
+writer = micropg_lite.BatchWriter(HOST, USER, PASSWORD, DATABASE, 'bench', port=PORT, max_rows=500)
+writer.conn = connect()
+def batch_writer():
+    for row in data: writer.add(row)
+    writer.flush()
+measure('BatchWriter, 500 per INSERT', batch_writer, ROWS, 'rows')
+writer.copy = True
+measure('BatchWriter, 500 per COPY', batch_writer, ROWS, 'rows')
+writer.close()
+
+conn.autocommit = True
+measure('select 1, autocommit', select("SELECT 1"), 1, 'query')
+
+report = ["SELECT count(*) FROM bench", "SELECT * FROM synthetic('narrow', 10)", "SELECT * FROM synthetic('numeric', 10)", "SELECT 1"]
+def one_by_one():
+    for q in report:
+        cur.execute(q)
+        cur.fetchall()
+def batch():
+    cur.execute_batch(report)
+    while True:
+        cur.fetchall()
+        if not cur.nextset(): break
+measure('4 statements, one by one', one_by_one, 4, 'stmt')
+measure('4 statements, execute_batch', batch, 4, 'stmt')
+
+# Time until a query that would run 10 s has been cancelled and the connection answers again
+slow = connect(query_timeout=0.05)
+def cancelled():
+    try: slow.cursor().execute('SELECT pg_sleep(10)')
+    except micropg_lite.OperationalError: pass
+    slow.cursor().execute('SELECT 1')
+measure('pg_sleep(10), 50 ms timeout', cancelled, 1, 'query', 1)
+slow.close()
+cur.execute("DROP TABLE bench")
+conn.close()
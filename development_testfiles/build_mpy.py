@@ -0,0 +1,30 @@
+# Precompiles micropg_lite.py and the optional micropg_lite_*.py modules to .mpy files in ../build.
+# A .mpy file is imported without running the compiler on the device, which saves its RAM peak and startup time.
+# mpy-cross must match the .mpy version of the firmware: pip install mpy-cross (or the one built with MicroPython)
+#   python3 build_mpy.py [mpy-cross options, e.g. -march=xtensawin]
+
+import sys, os, glob, subprocess
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+build = os.path.join(root, 'build')
+
+try:
+    import mpy_cross
+    def run(*args):
+        return mpy_cross.run(*args).wait()
+except ImportError:
+    def run(*args):
+        try: return subprocess.call(('mpy-cross',) + args)
+        except OSError: sys.exit('mpy-cross not found: pip install mpy-cross')
+
+os.makedirs(build, exist_ok=True)
+total = [0, 0]
+for source in sorted(glob.glob(os.path.join(root, 'micropg_lite*.py'))):
+    name = os.path.basename(source)
+    target = os.path.join(build, name[:-3] + '.mpy')
+    if run(*sys.argv[1:], '-o', target, source):
+        sys.exit('mpy-cross failed for ' + name)
+    sizes = os.path.getsize(source), os.path.getsize(target)
+    total = [total[0] + sizes[0], total[1] + sizes[1]]
+    print('%-24s %8d bytes -> %8d bytes' % (name, sizes[0], sizes[1]))
+print('%-24s %8d bytes -> %8d bytes in %s' % ('total', total[0], total[1], os.path.normpath(build)))
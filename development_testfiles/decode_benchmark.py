@@ -0,0 +1,76 @@
+# Offline benchmark of the RowDescription/DataRow decode path in micropg_lite.
+# Prebuilt backend messages are replayed through connect._process_messages(), so no server or network is needed.
+# Runs with CPython and the MicroPython unix port: python3 decode_benchmark.py / micropython decode_benchmark.py
+
+import sys, time, struct
+sys.path.append('..')
+import micropg_lite
+
+ROWS = 2000
+
+def message(code, payload):
+    return code + (len(payload) + 4).to_bytes(4, 'big') + payload
+
+def result_set(columns, rows, fmt=0):
+    # columns: list of (name, oid, sample value in the given format or None)
+    desc = len(columns).to_bytes(2, 'big')
+    for name, oid, _ in columns:
+        desc += name.encode() + b'\x00' + bytes(6) + oid.to_bytes(4, 'big') + (8).to_bytes(2, 'big') + bytes(4) + fmt.to_bytes(2, 'big')
+    row = len(columns).to_bytes(2, 'big')
+    for _, _, value in columns:
+        row += b'\xff\xff\xff\xff' if value is None else len(value).to_bytes(4, 'big') + value
+    data_row = message(b'D', row)
+    return message(b'T', desc) + data_row * rows + message(b'C', b'SELECT %d\x00' % rows) + message(b'Z', b'T')
+
+class ReplaySocket:
+    def __init__(self, data):
+        self.data, self.pos = data, 0
+
+    def recv_into(self, mv):
+        n = min(len(mv), len(self.data) - self.pos)
+        mv[:n] = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+    def send(self, b):
+        return len(b)
+
+def replay_connection(data, bufsize=2048):
+    # A trust login is replayed in front of the messages
+    login = message(b'R', bytes(4)) + message(b'Z', b'I')
+    return micropg_lite.connect(None, 'postgres', None, None, bufsize=bufsize, sock=ReplaySocket(login + data))
+
+def bench(label, columns, rows=ROWS, fmt=0, lazy=False, read=None):
+    # read(row) is timed after the decode, e.g. to access a few columns of lazy rows
+    data = result_set(columns, rows, fmt)
+    best = None
+    for _ in range(5):
+        conn = replay_connection(data)
+        # As in execute(): _start() resets the cursor for a new result
+        cur = conn.cursor(lazy=lazy)
+        cur._start()
+        start = time.ticks_us() if hasattr(time, 'ticks_us') else time.perf_counter_ns() // 1000
+        conn._process_messages(cur)
+        if read:
+            for row in cur._rows: read(row)
+        end = time.ticks_us() if hasattr(time, 'ticks_us') else time.perf_counter_ns() // 1000
+        assert len(cur._rows) == rows
+        elapsed = end - start
+        best = elapsed if best is None or elapsed < best else best
+    print('%-12s %3d columns: %9d rows/s' % (label, len(columns), rows * 1000000 // max(best, 1)))
+
+NARROW = [('id', 23, b'12345'), ('value', 701, b'21.375'), ('name', 25, b'sensor-17')]
+WIDE = [('c%d' % i, (23, 701, 25, 16, 20)[i % 5], (b'4711', b'3.25', b'some text value', b't', None)[i % 5]) for i in range(30)]
+
+# Numeric telemetry row (time, sensor id, 4 readings, flag) in text and binary result format
+TELEMETRY = [('ts', 1114, b'2024-03-30 15:30:00.25'), ('sensor', 23, b'17'), ('t', 701, b'21.375'), ('h', 701, b'48.5'),
+             ('p', 701, b'1013.25'), ('v', 700, b'3.3'), ('ok', 16, b't')]
+TELEMETRY_BINARY = [('ts', 1114, struct.pack('!q', 765127800250000)), ('sensor', 23, struct.pack('!i', 17)), ('t', 701, struct.pack('!d', 21.375)),
+                    ('h', 701, struct.pack('!d', 48.5)), ('p', 701, struct.pack('!d', 1013.25)), ('v', 700, struct.pack('!f', 3.3)), ('ok', 16, b'\x01')]
+
+bench('narrow', NARROW)
+bench('wide', WIDE, ROWS // 4)
+bench('wide lazy', WIDE, ROWS // 4, lazy=True, read=lambda row: row[0])
+bench('wide lazy all', WIDE, ROWS // 4, lazy=True, read=tuple)
+bench('text', TELEMETRY)
+bench('binary', TELEMETRY_BINARY, fmt=1)
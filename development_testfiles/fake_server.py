@@ -0,0 +1,547 @@
+# Stand-in PostgreSQL server for testing and benchmarking micropg_lite offline. Needs CPython, the client can be
+# CPython or the MicroPython unix port.
+#   python3 fake_server.py [port] [password]       (default 5433, no password = trust auth, a password = SCRAM-SHA-256)
+# Speaks the v3 wire protocol: startup, SCRAM-SHA-256, simple and extended query (named statements and portals,
+# text and binary format), COPY FROM STDIN / TO STDOUT, errors with SQLSTATE, LISTEN/NOTIFY and CancelRequest.
+# SQL is run by sqlite3, so PostgreSQL-only syntax is not understood. Besides tables, synthetic result sets of any
+# size are produced without sqlite:  SELECT * FROM synthetic('narrow' | 'wide' | 'numeric', rows)
+# start() runs the server in a thread of the calling process and returns it with its port; srv.stats counts
+# server_flushes, client_messages and statements.
+import socket, socketserver, threading, sqlite3, struct, hashlib, hmac, base64, os, re, time, tempfile, sys
+
+TYPE_OIDS = {int: 20, float: 701, str: 25, bytes: 17, bool: 16}
+
+# name: (column names, type OIDs, values of every row)
+SYNTHETIC = {
+    'narrow': (['id', 'value', 'name'], [20, 701, 25], (12345, 21.375, 'sensor-17')),
+    'wide': (['c%d' % i for i in range(30)], [(20, 701, 25, 16, 25)[i % 5] for i in range(30)],
+             tuple((4711, 3.25, 'some text value', True, None)[i % 5] for i in range(30))),
+    'numeric': (['ts', 'sensor', 't', 'h', 'p'], [20, 20, 701, 701, 701], (1711812600, 17, 21.375, 48.5, 1013.25)),
+}
+SYNTHETIC_QUERY = re.compile(r"\s*SELECT\s+\*\s+FROM\s+synthetic\(\s*'(\w+)'\s*,\s*(\d+)\s*\)\s*$", re.I)
+_sessions = {}
+_listeners = {}
+_lock = threading.Lock()
+
+
+class PGError(Exception):
+    def __init__(self, code, msg):
+        Exception.__init__(self, msg)
+        self.code = code
+
+
+def _pg_error(e):
+    m = str(e)
+    if isinstance(e, PGError): return e
+    if isinstance(e, sqlite3.IntegrityError):
+        return PGError('23502' if 'NOT NULL' in m else '23505', m)
+    # pg_sleep() stops with a PGError, which sqlite reports as a failed user-defined function
+    if 'interrupted' in m or 'user-defined function raised exception' in m: return PGError('57014', 'canceling statement due to user request')
+    if 'no such table' in m: return PGError('42P01', m)
+    if 'syntax error' in m: return PGError('42601', m)
+    return PGError('XX000', m)
+
+
+def _split(sql):
+    out, cur, q = [], [], None
+    for ch in sql:
+        if q:
+            if ch == q: q = None
+        elif ch in "'\"": q = ch
+        elif ch == ';':
+            out.append(''.join(cur)); cur = []; continue
+        cur.append(ch)
+    out.append(''.join(cur))
+    return [s for s in out if s.strip()] or ['']
+
+
+def _to_sqlite(sql):
+    sql = re.sub(r'\$(\d+)', r'?\1', sql)
+    sql = re.sub(r'::\s*\w+(\[\])?', '', sql)
+    sql = re.sub(r'\bserial\b', 'INTEGER', sql, flags=re.I)
+    return sql
+
+
+def _text(v):
+    if v is None: return None
+    if v is True or v is False: return b't' if v else b'f'
+    if isinstance(v, bytes): return ('\\x' + v.hex()).encode()
+    if isinstance(v, float): return repr(v).encode()
+    return str(v).encode()
+
+
+def _binary(v, oid):
+    if oid in (20, 23, 21): return struct.pack('>q' if oid == 20 else '>i' if oid == 23 else '>h', v)
+    if oid in (701, 700): return struct.pack('>d' if oid == 701 else '>f', v)
+    if oid == 16: return b'\x01' if v else b'\x00'
+    if oid == 17: return bytes(v)
+    return _text(v)
+
+
+def _copy_unescape(f):
+    if f == '\\N': return None
+    return f.replace('\\t', '\t').replace('\\n', '\n').replace('\\r', '\r').replace('\\\\', '\\')
+
+
+def _copy_escape(v):
+    if v is None: return '\\N'
+    return (_text(v).decode()).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class Result:
+    def __init__(self, names=None, rows=None, tag='', oids=None):
+        self.names, self.rows, self.tag = names, rows or [], tag
+        self.oids = oids
+        if names is not None and oids is None:
+            self.oids = []
+            for i in range(len(names)):
+                oid = 25
+                for r in self.rows:
+                    if r[i] is not None:
+                        oid = TYPE_OIDS.get(type(r[i]), 25); break
+                self.oids.append(oid)
+        self.pos = 0
+
+
+class Session(socketserver.BaseRequestHandler):
+    def setup(self):
+        # Like PostgreSQL: without TCP_NODELAY a second small reply waits for the delayed ACK of the first one
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.out = bytearray()
+        self.wlock = threading.Lock()
+        self.stmts, self.portals = {}, {}
+        self.tx = b'I'
+        self.pid, self.secret = os.getpid() & 0xffff | (id(self) & 0x7fff0000), int.from_bytes(os.urandom(4), 'big') >> 1
+        self.cancelled = False
+        self.pending_notify = []
+        self.db = sqlite3.connect(self.server.db_path, timeout=10, isolation_level=None, check_same_thread=False)
+        # Commits must not wait for the disk, insert benchmarks measure the client
+        self.db.execute('PRAGMA synchronous=OFF')
+        self.db.create_function('pg_sleep', 1, self._sleep)
+        self.stats = self.server.stats
+
+    def _sleep(self, s):
+        end = time.time() + float(s or 0)
+        while time.time() < end:
+            if self.cancelled: raise PGError('57014', 'canceling statement due to user request')
+            time.sleep(0.01)
+        return None
+
+    # ---- io
+    def recv_exact(self, n):
+        b = bytearray()
+        while len(b) < n:
+            c = self.request.recv(n - len(b))
+            if not c: raise EOFError
+            b += c
+        return bytes(b)
+
+    def msg(self, code, payload=b''):
+        self.out += code + struct.pack('>i', len(payload) + 4) + payload
+        if len(self.out) > 65536: self.flush()
+
+    def flush(self):
+        if self.out:
+            with self.wlock:
+                self.request.sendall(self.out)
+            self.stats['server_flushes'] = self.stats.get('server_flushes', 0) + 1
+            self.out = bytearray()
+
+    def error(self, e, severity=b'ERROR'):
+        e = _pg_error(e)
+        self.msg(b'E', b'S' + severity + b'\x00V' + severity + b'\x00C' + e.code.encode() + b'\x00M' + str(e).encode() + b'\x00\x00')
+        if self.tx == b'T': self.tx = b'E'
+
+    def ready(self):
+        self.msg(b'Z', self.tx)
+        self.flush()
+
+    # ---- startup
+    def handle(self):
+        try:
+            if not self.startup(): return
+            with _lock: _sessions[(self.pid, self.secret)] = self
+            self.loop()
+        except EOFError:
+            pass
+        except Exception:
+            import traceback; traceback.print_exc()
+        finally:
+            with _lock:
+                _sessions.pop((self.pid, self.secret), None)
+                for s in _listeners.values(): s.discard(self)
+            self.db.close()
+
+    def startup(self):
+        while True:
+            ln, code = struct.unpack('>ii', self.recv_exact(8))
+            if code == 80877103:
+                self.request.sendall(b'N'); continue
+            if code == 80877102:
+                pid, secret = struct.unpack('>ii', self.recv_exact(8))
+                with _lock: s = _sessions.get((pid, secret))
+                if s:
+                    s.cancelled = True
+                    try: s.db.interrupt()
+                    except Exception: pass
+                return False
+            self.recv_exact(ln - 8)
+            break
+        pw = self.server.password
+        if pw is not None:
+            self.scram(pw)
+        self.msg(b'R', struct.pack('>i', 0))
+        for k, v in (('server_version', '16.0'), ('client_encoding', 'UTF8'), ('DateStyle', 'ISO, MDY'), ('integer_datetimes', 'on')):
+            self.msg(b'S', k.encode() + b'\x00' + v.encode() + b'\x00')
+        self.msg(b'K', struct.pack('>ii', self.pid, self.secret))
+        self.ready()
+        return True
+
+    def read_msg(self):
+        code = self.recv_exact(1)
+        ln = struct.unpack('>i', self.recv_exact(4))[0]
+        self.stats['client_messages'] = self.stats.get('client_messages', 0) + 1
+        return code, self.recv_exact(ln - 4)
+
+    def scram(self, pw):
+        self.msg(b'R', struct.pack('>i', 10) + b'SCRAM-SHA-256\x00\x00'); self.flush()
+        code, data = self.read_msg()
+        mech_end = data.index(b'\x00')
+        first = data[mech_end + 5:].decode()
+        bare = first.split(',', 2)[2]
+        cnonce = dict(kv.split('=', 1) for kv in bare.split(','))['r']
+        salt, iters = self.server.salt, self.server.iterations
+        nonce = cnonce + base64.b64encode(os.urandom(12)).decode()
+        server_first = 'r=%s,s=%s,i=%d' % (nonce, base64.b64encode(salt).decode(), iters)
+        self.msg(b'R', struct.pack('>i', 11) + server_first.encode()); self.flush()
+        code, data = self.read_msg()
+        final = data.decode()
+        without_proof, proof = final.rsplit(',p=', 1)
+        auth = (bare + ',' + server_first + ',' + without_proof).encode()
+        sp = hashlib.pbkdf2_hmac('sha256', pw.encode(), salt, iters)
+        ck = hmac.new(sp, b'Client Key', 'sha256').digest()
+        sk = hashlib.sha256(ck).digest()
+        sig = hmac.new(sk, auth, 'sha256').digest()
+        recovered = bytes(a ^ b for a, b in zip(base64.b64decode(proof), sig))
+        if hashlib.sha256(recovered).digest() != sk:
+            self.error(PGError('28P01', 'password authentication failed'), b'FATAL'); self.flush()
+            raise EOFError
+        server_key = hmac.new(sp, b'Server Key', 'sha256').digest()
+        v = base64.b64encode(hmac.new(server_key, auth, 'sha256').digest()).decode()
+        if self.server.bad_signature: v = base64.b64encode(os.urandom(32)).decode()
+        self.msg(b'R', struct.pack('>i', 12) + ('v=' + v).encode())
+
+    # ---- main loop
+    def loop(self):
+        skip = False
+        while True:
+            code, data = self.read_msg()
+            if code == b'X': return
+            if skip and code not in (b'S',): continue
+            try:
+                if code == b'Q': self.simple(data)
+                elif code == b'P': self.parse(data)
+                elif code == b'B': self.bind(data)
+                elif code == b'D': self.describe(data)
+                elif code == b'E': self.execute(data)
+                elif code == b'C': self.close_(data)
+                elif code == b'H': self.flush()
+                elif code == b'S':
+                    skip = False
+                    if self.tx == b'I': self.portals.clear()
+                    self.ready()
+            except Exception as e:
+                self.error(e)
+                skip = True
+
+    def simple(self, data):
+        sql = data[:-1].decode()
+        self.cancelled = False
+        for stmt in _split(sql):
+            if not stmt.strip():
+                self.msg(b'I'); continue
+            try:
+                res = self.run(stmt, ())
+                if res.names is not None:
+                    self.row_description(res, None)
+                    self.send_rows(res, 0, None)
+                else:
+                    self.msg(b'C', res.tag.encode() + b'\x00')
+            except Exception as e:
+                self.error(e)
+                break
+        self.ready()
+
+    def parse(self, data):
+        name, rest = data.split(b'\x00', 1)
+        sql, rest = rest.split(b'\x00', 1)
+        n = struct.unpack('>h', rest[:2])[0]
+        oids = list(struct.unpack('>%di' % n, rest[2:2 + 4 * n]))
+        self.stmts[name] = [sql.decode(), oids, None]
+        self.msg(b'1')
+
+    def bind(self, data):
+        portal, rest = data.split(b'\x00', 1)
+        stmt, rest = rest.split(b'\x00', 1)
+        if stmt not in self.stmts: raise PGError('26000', 'prepared statement "%s" does not exist' % stmt.decode())
+        sql, oids, described = self.stmts[stmt]
+        n = struct.unpack('>h', rest[:2])[0]; p = 2
+        fmts = struct.unpack('>%dh' % n, rest[p:p + 2 * n]); p += 2 * n
+        np = struct.unpack('>h', rest[p:p + 2])[0]; p += 2
+        params = []
+        for i in range(np):
+            ln = struct.unpack('>i', rest[p:p + 4])[0]; p += 4
+            if ln < 0: params.append(None); continue
+            raw = rest[p:p + ln]; p += ln
+            fmt = fmts[i] if len(fmts) > 1 else fmts[0] if fmts else 0
+            oid = oids[i] if i < len(oids) else 0
+            params.append(self.param(raw, fmt, oid))
+        nr = struct.unpack('>h', rest[p:p + 2])[0]; p += 2
+        rfmts = struct.unpack('>%dh' % nr, rest[p:p + 2 * nr])
+        self.portals[portal] = [sql, params, rfmts, None, described]
+        self.msg(b'2')
+
+    def param(self, raw, fmt, oid):
+        if fmt == 1:
+            if oid == 20: return struct.unpack('>q', raw)[0]
+            if oid == 23: return struct.unpack('>i', raw)[0]
+            if oid == 21: return struct.unpack('>h', raw)[0]
+            if oid == 701: return struct.unpack('>d', raw)[0]
+            if oid == 700: return struct.unpack('>f', raw)[0]
+            if oid == 16: return raw == b'\x01'
+            if oid in (17, 0): return raw
+            return raw.decode()
+        s = raw.decode()
+        if oid in (20, 23, 21): return int(s)
+        if oid in (700, 701, 1700): return float(s)
+        if oid == 16: return s in ('t', 'true', '1')
+        if oid == 17 and s.startswith('\\x'): return bytes.fromhex(s[2:])
+        return s
+
+    def describe(self, data):
+        kind, name = data[:1], data[1:-1]
+        if kind == b'S':
+            st = self.stmts[name]
+            sql, oids = st[0], st[1]
+            nparams = len(set(re.findall(r'\$(\d+)', sql)))
+            self.msg(b't', struct.pack('>h', nparams) + b''.join(struct.pack('>i', oids[i] if i < len(oids) else 25) for i in range(nparams)))
+            res = self.probe(sql, nparams)
+            if res is None or res.names is None: self.msg(b'n')
+            else:
+                st[2] = res.oids
+                self.row_description(res, None)
+        else:
+            portal = self.portals[name]
+            res = self.portal_result(portal)
+            if res.names is None: self.msg(b'n')
+            else: self.row_description(res, portal[2])
+
+    def probe(self, sql, nparams):
+        m = SYNTHETIC_QUERY.match(sql)
+        if m: return Result(SYNTHETIC[m.group(1)][0], [], oids=SYNTHETIC[m.group(1)][1])
+        head = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ''
+        if head not in ('SELECT', 'WITH', 'VALUES'):
+            if re.search(r'\bRETURNING\b', sql, re.I):
+                m = re.search(r'\bRETURNING\b(.*)$', sql, re.I | re.S)
+                names = [c.strip().split()[-1] for c in m.group(1).split(',')]
+                return Result(names, [], oids=[25] * len(names))
+            return None
+        cur = self.db.execute(_to_sqlite(sql), {str(i + 1): None for i in range(nparams)})
+        rows = cur.fetchmany(1)
+        names = [d[0] for d in cur.description]
+        return Result(names, rows, oids=[self.decl_oid(n) if not rows or rows[0][i] is None else TYPE_OIDS.get(type(rows[0][i]), 25) for i, n in enumerate(names)])
+
+    def decl_oid(self, column):
+        for (t,) in self.db.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+            for r in self.db.execute('PRAGMA table_info(%s)' % t):
+                if r[1].lower() == column.lower():
+                    d = r[2].upper()
+                    if 'INT' in d or 'SERIAL' in d: return 20
+                    if 'REAL' in d or 'FLOA' in d or 'DOUB' in d or 'NUMERIC' in d: return 701
+                    if 'BLOB' in d or 'BYTEA' in d: return 17
+                    if 'BOOL' in d: return 16
+                    return 25
+        return 25
+
+    def portal_result(self, portal):
+        if portal[3] is None:
+            self.cancelled = False
+            portal[3] = self.run(portal[0], portal[1])
+            if portal[4] and portal[3].names is not None: portal[3].oids = portal[4]
+        return portal[3]
+
+    def execute(self, data):
+        name, rest = data.split(b'\x00', 1)
+        maxrows = struct.unpack('>i', rest[:4])[0]
+        portal = self.portals[name]
+        res = self.portal_result(portal)
+        if res.names is None:
+            self.msg(b'C', res.tag.encode() + b'\x00')
+            return
+        if self.send_rows(res, maxrows, portal[2]):
+            self.msg(b's')
+
+    def close_(self, data):
+        kind, name = data[:1], data[1:-1]
+        (self.stmts if kind == b'S' else self.portals).pop(name, None)
+        self.msg(b'3')
+
+    def row_description(self, res, fmts):
+        b = [struct.pack('>h', len(res.names))]
+        for i, n in enumerate(res.names):
+            f = (fmts[i] if len(fmts) > 1 else fmts[0]) if fmts else 0
+            size = {20: 8, 701: 8, 16: 1}.get(res.oids[i], -1)
+            b.append(n.encode() + b'\x00' + struct.pack('>ihihih', 0, 0, res.oids[i], size, -1, f))
+        self.msg(b'T', b''.join(b))
+
+    def send_rows(self, res, maxrows, fmts):
+        end = len(res.rows) if maxrows <= 0 else min(len(res.rows), res.pos + maxrows)
+        oids = res.oids
+        last = None
+        for r in res.rows[res.pos:end]:
+            # Synthetic results repeat the same row object, it is encoded once
+            if r is not last:
+                parts = [struct.pack('>h', len(r))]
+                for i, v in enumerate(r):
+                    f = (fmts[i] if len(fmts) > 1 else fmts[0]) if fmts else 0
+                    enc = None if v is None else (_binary(v, oids[i]) if f == 1 else _text(v))
+                    parts.append(b'\xff\xff\xff\xff' if enc is None else struct.pack('>i', len(enc)) + enc)
+                data, last = b''.join(parts), r
+            self.msg(b'D', data)
+        res.pos = end
+        if end < len(res.rows): return True
+        self.msg(b'C', res.tag.encode() + b'\x00')
+        return False
+
+    # ---- statement execution
+    def run(self, stmt, params):
+        s = stmt.strip()
+        words = s.split()
+        head = words[0].upper() if words else ''
+        if self.tx == b'E' and head not in ('ROLLBACK', 'COMMIT', 'END', 'ABORT'):
+            raise PGError('25P02', 'current transaction is aborted, commands ignored until end of transaction block')
+        self.stats['statements'] = self.stats.get('statements', 0) + 1
+        if head in ('BEGIN', 'START'):
+            if self.tx == b'I': self.db.execute('BEGIN')
+            self.tx = b'T'
+            return Result(tag='BEGIN')
+        if head in ('COMMIT', 'END'):
+            tag = 'COMMIT'
+            if self.tx == b'E': tag = 'ROLLBACK'
+            if self.db.in_transaction: self.db.execute('ROLLBACK' if self.tx == b'E' else 'COMMIT')
+            self.tx = b'I'
+            self.deliver()
+            return Result(tag=tag)
+        if head in ('ROLLBACK', 'ABORT'):
+            if self.db.in_transaction: self.db.execute('ROLLBACK')
+            self.tx = b'I'
+            self.pending_notify = []
+            return Result(tag='ROLLBACK')
+        if head in ('SET', 'RESET', 'DISCARD', 'DEALLOCATE'):
+            if head == 'DISCARD' or words[-1].upper() == 'ALL': self.stmts.clear()
+            return Result(tag=head if head != 'DISCARD' else 'DISCARD ALL')
+        if head in ('CREATE', 'DROP') and len(words) > 1 and words[1].upper() == 'DATABASE':
+            return Result(tag=head + ' DATABASE')
+        if head == 'LISTEN':
+            with _lock: _listeners.setdefault(words[1].strip('"'), set()).add(self)
+            return Result(tag='LISTEN')
+        if head == 'UNLISTEN':
+            with _lock:
+                for ch, ss in _listeners.items():
+                    if words[1] == '*' or ch == words[1].strip('"'): ss.discard(self)
+            return Result(tag='UNLISTEN')
+        if head == 'NOTIFY':
+            m = re.match(r"NOTIFY\s+(\w+)\s*(?:,\s*'((?:[^']|'')*)')?", s, re.I)
+            self.pending_notify.append((m.group(1), (m.group(2) or '').replace("''", "'")))
+            if self.tx == b'I': self.deliver()
+            return Result(tag='NOTIFY')
+        if head == 'COPY':
+            return self.copy(s, params)
+        m = SYNTHETIC_QUERY.match(s)
+        if m:
+            names, oids, row = SYNTHETIC[m.group(1)]
+            return Result(names, [row] * int(m.group(2)), 'SELECT %s' % m.group(2), oids)
+        if head == 'TRUNCATE':
+            t = words[2] if words[1].upper() == 'TABLE' else words[1]
+            self.db.execute('DELETE FROM ' + t)
+            return Result(tag='TRUNCATE TABLE')
+        cur = self.db.execute(_to_sqlite(s), {str(i + 1): v for i, v in enumerate(params)} if params else ())
+        if cur.description is not None:
+            rows = cur.fetchall()
+            if head == 'INSERT': tag = 'INSERT 0 %d' % len(rows)
+            elif head in ('UPDATE', 'DELETE'): tag = '%s %d' % (head, len(rows))
+            else: tag = 'SELECT %d' % len(rows)
+            return Result([d[0] for d in cur.description], rows, tag)
+        if head == 'INSERT': return Result(tag='INSERT 0 %d' % cur.rowcount)
+        if head in ('UPDATE', 'DELETE'): return Result(tag='%s %d' % (head, cur.rowcount))
+        return Result(tag=' '.join(w.upper() for w in words[:2]))
+
+    def deliver(self):
+        pending, self.pending_notify = self.pending_notify, []
+        for ch, payload in pending:
+            with _lock: targets = list(_listeners.get(ch, ()))
+            for t in targets:
+                m = struct.pack('>i', self.pid) + ch.encode() + b'\x00' + payload.encode() + b'\x00'
+                m = b'A' + struct.pack('>i', len(m) + 4) + m
+                if t is self: self.out += m
+                else:
+                    with t.wlock: t.request.sendall(m)
+
+    def copy(self, s, params):
+        m = re.match(r'COPY\s+(\(.*\)|[\w.]+)\s*(\(([^)]*)\))?\s+(FROM\s+STDIN|TO\s+STDOUT)', s, re.I | re.S)
+        if not m: raise PGError('42601', 'syntax error in COPY')
+        target, cols = m.group(1), m.group(3)
+        if m.group(4).upper().startswith('TO'):
+            q = target[1:-1] if target.startswith('(') else 'SELECT %s FROM %s' % (cols or '*', target)
+            res = self.run(q, params)
+            self.msg(b'H', b'\x00' + struct.pack('>h', len(res.names)) + b'\x00\x00' * len(res.names))
+            for r in res.rows:
+                self.msg(b'd', ('\t'.join(_copy_escape(v) for v in r) + '\n').encode())
+            self.msg(b'c')
+            return Result(tag='COPY %d' % len(res.rows))
+        names = [c.strip() for c in cols.split(',')] if cols else [r[1] for r in self.db.execute('PRAGMA table_info(%s)' % target)]
+        self.msg(b'G', b'\x00' + struct.pack('>h', len(names)) + b'\x00\x00' * len(names))
+        self.flush()
+        buf = bytearray()
+        while True:
+            code, data = self.read_msg()
+            if code == b'd': buf += data
+            elif code == b'c': break
+            elif code == b'f': raise PGError('57014', 'COPY from stdin failed: ' + data[:-1].decode())
+            elif code in (b'H', b'S'): continue
+        n = 0
+        sql = 'INSERT INTO %s (%s) VALUES (%s)' % (target, ','.join(names), ','.join('?' * len(names)))
+        for line in buf.decode().split('\n'):
+            if not line or line == '\\.': continue
+            self.db.execute(sql, [_copy_unescape(f) for f in line.split('\t')])
+            n += 1
+        return Result(tag='COPY %d' % n)
+
+
+class Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def start(port=0, password=None, iterations=4096, db_path=None):
+    srv = Server(('127.0.0.1', port), Session)
+    srv.password = password
+    srv.salt = os.urandom(16)
+    srv.iterations = iterations
+    srv.bad_signature = False
+    srv.stats = {}
+    srv.db_path = db_path or os.path.join(tempfile.mkdtemp(), 'fake.db')
+    sqlite3.connect(srv.db_path).execute('PRAGMA journal_mode=WAL').fetchall()
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, srv.server_address[1]
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5433
+    pw = sys.argv[2] if len(sys.argv) > 2 else None
+    srv, port = start(port, pw)
+    print('fake server listening on 127.0.0.1:%d (%s)' % (port, 'SCRAM-SHA-256' if pw else 'trust'))
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
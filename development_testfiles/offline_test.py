@@ -0,0 +1,161 @@
+# Behaviour tests of micropg_lite against the stand-in server of fake_server.py, started in this process, so no
+# PostgreSQL server or network is needed. Needs CPython: python3 offline_test.py
+# test_script.py covers the same ground against a real server from a microcontroller.
+
+import sys, asyncio
+sys.path.append('..')
+import micropg_lite
+import fake_server
+
+server, PORT = fake_server.start(password='secret')
+
+def connect(**kwargs):
+    return micropg_lite.connect('127.0.0.1', 'postgres', 'secret', 'postgres', port=PORT, **kwargs)
+
+def count(table):
+    # Seen from another session, so only committed rows count
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute('SELECT count(*) FROM %s' % table)
+    n = cur.fetchall()[0][0]
+    conn.close()
+    return n
+
+def check(label, ok):
+    print('%-60s %s' % (label, 'ok' if ok else '!!!failed!!!'))
+    assert ok, label
+
+def setup():
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute('DROP TABLE IF EXISTS t')
+    cur.execute('CREATE TABLE t (id INTEGER, name TEXT)')
+    conn.commit()
+    conn.close()
+
+def autocommit_after_transaction():
+    # A SELECT opens a transaction, autocommit is switched on within it: the next statement commits both
+    setup()
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute('SELECT count(*) FROM t')
+    conn.autocommit = True
+    cur.execute("INSERT INTO t VALUES (1, 'simple')")
+    cur.execute('INSERT INTO t VALUES (%s, %s)', (2, 'prepared'))
+    conn.close()
+    check('autocommit commits a transaction opened before it was set', count('t') == 2)
+
+def autocommit_stream():
+    # The transaction of an autocommit stream cursor takes in no other statement
+    setup()
+    conn = connect()
+    conn.autocommit = True
+    stream = conn.cursor(stream=1)
+    stream.execute("SELECT * FROM synthetic('narrow', 5)")
+    stream.fetchone()
+    try:
+        conn.cursor().execute('INSERT INTO t VALUES (%s, %s)', (1, 'joined'))
+        refused = False
+    except Exception as e: refused = str(e).startswith('25001')
+    check('autocommit statement while a stream cursor has rows left', refused)
+    stream.close()
+    conn.cursor().execute('INSERT INTO t VALUES (%s, %s)', (1, 'after'))
+    check('stream cursor closed, no transaction left', conn._ready_for_query == b'I')
+    conn.close()
+    check('autocommit statement after the stream is committed', count('t') == 1)
+
+def autocommit_begin():
+    # begin() groups statements under autocommit, executemany() included, until rollback()
+    setup()
+    conn = connect()
+    conn.autocommit = True
+    conn.begin()
+    cur = conn.cursor()
+    cur.execute("INSERT INTO t VALUES (1, 'a')")
+    cur.executemany('INSERT INTO t VALUES (%s, %s)', [(2, 'b'), (3, 'c')])
+    check('begin() under autocommit keeps the transaction open', conn._ready_for_query == b'T')
+    conn.rollback()
+    cur.executemany('INSERT INTO t VALUES (%s, %s)', [(4, 'd'), (5, 'e')])
+    conn.close()
+    check('rolled back, then an autocommit executemany()', count('t') == 2)
+
+def quoting():
+    # Parameters of statements the server cannot bind are quoted into the SQL by Cursor._parameters()
+    conn = connect()
+    cur = conn.cursor()
+    conn.parameters['standard_conforming_strings'] = 'on'
+    check('quote doubled', cur._parameters('SET application_name = %s', ("it's",)) == ("SET application_name = 'it''s'", ()))
+    check('backslash kept with standard_conforming_strings on', cur._parameters('SET x = %s', ('a\\b',)) == ("SET x = 'a\\b'", ()))
+    check('NULL, bytes, array and bool literals', cur._parameters('SET x = %s, %s, %s, %s', (None, b'\x01\xff', [1, None, 'a"b'], True)) ==
+          ('SET x = NULL, \'\\x01ff\', \'{"1",NULL,"a\\"b"}\', \'t\'', ()))
+    conn.parameters['standard_conforming_strings'] = 'off'
+    check('backslashes doubled with standard_conforming_strings off', cur._parameters('SET x = %s, %s', ('a\\b', b'\x01')) ==
+          ("SET x = 'a\\\\b', '\\\\x01'", ()))
+    conn.parameters['standard_conforming_strings'] = 'on'
+    try:
+        cur.execute('SET x = %s', (1, 2))
+        refused = False
+    except Exception as e: refused = str(e).startswith('08P01') and not conn._wbuf
+    check('more parameters than placeholders, nothing sent', refused)
+    # A single SELECT, INSERT, ... binds, also with a trailing ; or in lower case; several statements are quoted
+    check('single statement binds', cur._parameters('SELECT %s;', (1,)) == ('SELECT $1;', (1,)))
+    check('lower case statement binds', cur._parameters('  select %s', (1,)) == ('  select $1', (1,)))
+    check('several statements are quoted', cur._parameters('SELECT %s; SELECT %s', (1, 2)) == ("SELECT '1'; SELECT '2'", ()))
+    cur.execute('SELECT %s', (1,))
+    check('bound statement is prepared', list(conn._stmt_cache) == ['SELECT $1'] and cur.fetchall() == [('1',)])
+    cur.execute('SELECT %s; SELECT %s', ("it's", None))
+    first = cur.fetchall()
+    cur.nextset()
+    check('quoted statements run as a simple query', first == [("it's",)] and cur.fetchall() == [(None,)] and len(conn._stmt_cache) == 1)
+    conn.close()
+
+class Sink:
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, b):
+        self.data += b
+
+def async_cursor():
+    # COPY on an AsyncConnection in both directions, and a cursor that is only async iterable
+    setup()
+    async def run():
+        conn = await micropg_lite.AsyncConnection('127.0.0.1', 'postgres', 'secret', 'postgres', port=PORT).open()
+        cur = conn.cursor()
+        await cur.copy_from('t', ((i, 'row %d' % i) for i in range(1000)), size=1024)
+        check('async copy_from() of a generator, several chunks', cur.rowcount == 1000)
+        await conn.commit()
+        def failing():
+            yield (1, 'a')
+            raise ValueError('sensor gone')
+        try:
+            await cur.copy_from('t', failing())
+            passed_on = False
+        except ValueError: passed_on = True
+        check('async copy_from() passes the error of the row source on', passed_on)
+        try:
+            await cur.copy_from('nosuch', [(1, 'a')])
+            raised = False
+        except micropg_lite.ProgrammingError: raised = True
+        check('async copy_from() into a missing table', raised)
+        sink = Sink()
+        await cur.copy_to('SELECT id, name FROM t ORDER BY id', sink, size=512)
+        lines = bytes(sink.data).split(b'\n')
+        check('async copy_to()', len(lines) == 1001 and lines[0] == b'0\trow 0')
+        try:
+            iter(cur)
+            refused = False
+        except TypeError: refused = True
+        check('AsyncCursor is not iterable, only async iterable', refused)
+        await cur.execute('SELECT id FROM t ORDER BY id LIMIT 2')
+        check('async for', [row async for row in cur] == [(0,), (1,)])
+        await conn.close()
+    asyncio.run(run())
+    check('async copy_from(): only the committed COPY is in the table', count('t') == 1000)
+
+autocommit_after_transaction()
+autocommit_stream()
+autocommit_begin()
+quoting()
+async_cursor()
+server.shutdown()
@@ -0,0 +1,108 @@
+# Counts the network round trips micropg_lite needs for common transaction patterns.
+# A scripted socket answers the client messages like a PostgreSQL server would, so no server or network is needed.
+# Every write of the client is one round trip, because the client always waits for the answer before it sends again.
+# Runs with CPython and the MicroPython unix port: python3 roundtrip_test.py / micropython roundtrip_test.py
+
+import sys
+sys.path.append('..')
+import micropg_lite
+
+N = 20
+
+def message(code, payload=b''):
+    return code + (len(payload) + 4).to_bytes(4, 'big') + payload
+
+class ScriptedSocket:
+    def __init__(self):
+        self.out, self.pos, self.writes, self.tx, self.started = bytearray(), 0, 0, b'I', False
+
+    def recv_into(self, mv):
+        n = min(len(mv), len(self.out) - self.pos)
+        mv[:n] = self.out[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+    def send(self, b):
+        self.writes += 1
+        b, n = bytes(b), 0
+        if not self.started:
+            # StartupMessage (no message code): trust login
+            self.started = True
+            self.out += message(b'R', bytes(4)) + message(b'Z', b'I')
+            return len(b)
+        while n < len(b):
+            code, ln = b[n:n + 1], int.from_bytes(b[n + 1:n + 5], 'big')
+            self.answer(code, b[n + 5:n + 1 + ln])
+            n += 1 + ln
+        return len(b)
+
+    def answer(self, code, data):
+        if code == b'Q':
+            tag = data[:-1].split(b' ')[0].upper()
+            if tag == b'BEGIN': self.tx = b'T'
+            elif tag in (b'COMMIT', b'ROLLBACK'): self.tx = b'I'
+            if b'fail' in data:
+                if self.tx == b'T': self.tx = b'E'
+                self.out += message(b'E', b'SERROR\x00VERROR\x00C23505\x00Mduplicate key value\x00\x00') + message(b'Z', self.tx)
+            else: self.out += message(b'C', tag + b'\x00') + message(b'Z', self.tx)
+        elif code == b'P': self.out += message(b'1')
+        elif code == b'B': self.out += message(b'2')
+        elif code == b'D': self.out += message(b't', b'\x00\x00') + message(b'n')
+        elif code == b'E': self.out += message(b'C', b'INSERT 0 1\x00')
+        elif code == b'C': self.out += message(b'3')
+        elif code == b'S': self.out += message(b'Z', self.tx)
+
+def scripted_connection(autocommit):
+    conn = micropg_lite.connect(None, 'postgres', None, None, sock=ScriptedSocket())
+    conn.autocommit = autocommit
+    # The login is not counted
+    conn.sock.writes = 0
+    return conn
+
+def count(label, autocommit, work, expected):
+    conn = scripted_connection(autocommit)
+    conn.instrument()
+    work(conn, conn.cursor())
+    per_op = conn.sock.writes / N
+    print('%-40s %5.2f round trips per statement (expected %.2f)' % (label, per_op, expected))
+    assert per_op == expected, label
+    assert conn.stats['round_trips'] == conn.sock.writes, label
+
+def statement_commit(conn, cur):
+    for i in range(N):
+        cur.execute("INSERT INTO t VALUES (1)")
+        conn.commit()
+
+def prepared_commit(conn, cur):
+    for i in range(N):
+        cur.execute("INSERT INTO t VALUES (%s)", (i,))
+        conn.commit()
+
+def statements(conn, cur):
+    for i in range(N):
+        cur.execute("INSERT INTO t VALUES (1)")
+
+def prepared(conn, cur):
+    for i in range(N):
+        cur.execute("INSERT INTO t VALUES (%s)", (i,))
+
+def one_transaction(conn, cur):
+    for i in range(N - 1):
+        cur.execute("INSERT INTO t VALUES (1)")
+    conn.commit()
+
+def failing_statements(conn, cur):
+    # The connection stays usable after an error, and the ROLLBACK of the failed transaction goes out with the next statement
+    for i in range(N // 2):
+        try: cur.execute("INSERT INTO fail VALUES (1)")
+        except micropg_lite.IntegrityError: pass
+        cur.execute("INSERT INTO t VALUES (1)")
+        conn.commit()
+        assert conn._ready_for_query == b'I'
+
+count('statement + commit()', False, statement_commit, 2)
+count('prepared statement + commit()', False, prepared_commit, 2)
+count('autocommit statement', True, statements, 1)
+count('autocommit prepared statement', True, prepared, 1)
+count('%d statements in one transaction' % (N - 1), False, one_transaction, 1)
+count('failed statement, statement + commit()', False, failing_statements, 1.5)
@@ -0,0 +1,96 @@
+# Connect latency of micropg_lite versus the SCRAM-SHA-256 iteration count of the server (PostgreSQL default: 4096).
+# A scripted socket plays the server side of the startup and SCRAM exchange, so no server or network is needed.
+# The "old loop" column is the key derivation alone as micropg_lite did it up to version 3.1.0.
+# Runs with CPython and the MicroPython unix port: python3 scram_benchmark.py / micropython scram_benchmark.py
+
+import sys, time, hashlib, binascii
+sys.path.append('..')
+import micropg_lite
+
+ITERATIONS = (1024, 4096, 16384)
+
+def ticks():
+    return time.ticks_us() if hasattr(time, 'ticks_us') else time.perf_counter_ns() // 1000
+
+def message(code, payload=b''):
+    return code + (len(payload) + 4).to_bytes(4, 'big') + payload
+
+def auth(kind, payload=b''):
+    return message(b'R', kind.to_bytes(4, 'big') + payload)
+
+SALT = b'0123456789abcdef'
+
+class ScriptedServer:
+    iterations = 4096
+    server_key = None
+
+    def __init__(self, *args):
+        self.out, self.pos, self.step = bytearray(), 0, 0
+
+    def connect(self, address):
+        pass
+
+    def recv_into(self, mv):
+        n = min(len(mv), len(self.out) - self.pos)
+        mv[:n] = self.out[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+    def send(self, b):
+        self.step += 1
+        if self.step == 1:
+            self.out += auth(10, b'SCRAM-SHA-256\x00\x00')
+        elif self.step == 2:
+            self.client_first = bytes(b).split(b'n,,')[1]
+            nonce = self.client_first.split(b'r=')[1]
+            self.server_first = b'r=' + nonce + b'srv,s=' + binascii.b2a_base64(SALT).rstrip(b'\n') + b',i=%d' % self.iterations
+            self.out += auth(11, self.server_first)
+        elif self.step == 3:
+            # ServerSignature over the AuthMessage, the server key is derived outside of the timed connect
+            final = bytes(b)[5:].split(b',p=')[0]
+            signature = micropg_lite.hmac_sha256_digest(self.server_key, self.client_first + b',' + self.server_first + b',' + final)
+            self.out += auth(12, b'v=' + binascii.b2a_base64(signature).rstrip(b'\n')) + auth(0) + message(b'Z', b'I')
+        return len(b)
+
+    def close(self):
+        pass
+
+class ScriptedSocketModule:
+    socket = ScriptedServer
+
+    def getaddrinfo(self, host, port):
+        return [(None, None, None, None, (host, port))]
+
+def old_salted_password(password, salt, iterations):
+    def hmac_sha256_digest(key, msg):
+        pad_key = key + b'\x00' * (64 - len(key) % 64)
+        return hashlib.sha256(bytes(0x5c ^ b for b in pad_key) + hashlib.sha256(bytes(0x36 ^ b for b in pad_key) + msg).digest()).digest()
+    u1 = hmac_sha256_digest(password, salt + b'\x00\x00\x00\x01')
+    ui = int.from_bytes(u1, 'big')
+    for _ in range(iterations - 1):
+        u1 = hmac_sha256_digest(password, u1)
+        ui ^= int.from_bytes(u1, 'big')
+    return ui.to_bytes(32, 'big')
+
+def best_of(f, n=3):
+    best = None
+    for _ in range(n):
+        start = ticks()
+        f()
+        elapsed = ticks() - start
+        best = elapsed if best is None or elapsed < best else best
+    return best
+
+micropg_lite.socket = ScriptedSocketModule()
+print('pbkdf2_hmac in hashlib: %s, hash copy(): %s' % (hasattr(hashlib, 'pbkdf2_hmac'), hasattr(hashlib.sha256(), 'copy')))
+print('%10s %14s %14s %14s' % ('iterations', 'connect [ms]', 'cached [ms]', 'old loop [ms]'))
+for iterations in ITERATIONS:
+    ScriptedServer.iterations = iterations
+    ScriptedServer.server_key = micropg_lite.hmac_sha256_digest(micropg_lite.salted_password(b'secret', SALT, iterations), b'Server Key')
+    assert micropg_lite.salted_password(b'secret', b'salt', iterations) == old_salted_password(b'secret', b'salt', iterations)
+    now = best_of(lambda: micropg_lite.connect('127.0.0.1', 'postgres', 'secret', 'postgres'))
+    # Reconnect with connect(..., scram_cache=True): the first connect derives the keys, the timed ones reuse them
+    micropg_lite.connect('127.0.0.1', 'postgres', 'secret', 'postgres', scram_cache=True)
+    cached = best_of(lambda: micropg_lite.connect('127.0.0.1', 'postgres', 'secret', 'postgres', scram_cache=True))
+    before = best_of(lambda: old_salted_password(b'secret', SALT, iterations), 1)
+    print('%10d %14.1f %14.1f %14.1f' % (iterations, now / 1000, cached / 1000, before / 1000))
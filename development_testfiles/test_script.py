@@ -163,8 +163,12 @@ print("---")
 ### Autocommit test
 conn.autocommit = True
 cur.execute("INSERT INTO customers (firstName, lastName, email, birthDate, specialNote, loyaltyPoints) VALUES ('Auto', 'Commit', 'auto.commit@test.com', '2000-01-01', 'Autocommit test', 0)")
-cur.execute('select count(Id) from customers')
-selectresult = cur.fetchall()
+# Counted by a second connection, which only sees committed rows
+other = micropg_lite.connect(host=db_host, user=db_user, password=db_password, database=db_database, use_ssl=True)
+otherCur = other.cursor()
+otherCur.execute('select count(Id) from customers')
+selectresult = otherCur.fetchall()
+other.close()
 if (selectresult[0][0] == 13):
     print("AUTOCOMMIT ok")
     cur.execute("DELETE FROM customers WHERE firstName = 'Auto' AND lastName = 'Commit'")
@@ -221,6 +225,15 @@ except Exception:
     successCount = successCount + 1
     print("---")
 
+### Async COPY test: async cursors must refuse COPY instead of silently sending nothing
+try:
+    micropg_lite.AsyncConnection(db_host, db_user, db_password, db_database).cursor().copy_from('customers', [])
+    print("Async COPY !!!failed!!!")
+    successCount = successCount + 1
+except NotImplementedError:
+    print("Async COPY ok")
+print("---")
+
 ### Test end. Finish script
 print("\n---")
 
@@ -29,37 +29,256 @@
 
 ### Version 3.1.0
 
-import ssl, hashlib, socket, binascii, random
+import socket, binascii, struct, time
 
 # -----------------------------------------------------------------------------
 
 def raiseExceptionLostConnection():
     raise Exception("08003:Lost connection")
 
-def hmac_sha256_digest(key, msg):
-    pad_key = key + b'\x00' * (64 - len(key) % 64)
-    return hashlib.sha256(bytes(0x5c ^ b for b in pad_key) + hashlib.sha256(bytes(0x36 ^ b for b in pad_key) + msg).digest()).digest()
+class DatabaseError(Exception):
+    # ErrorResponse of the server. str() is 'SQLSTATE:message' as for all errors of this module, the attributes sqlstate,
+    # message, severity, detail, hint, position and fields (every field of the message by its one-letter code) are set
+    # by micropg_lite_errors.
+    pass
+
+def _database_error(data):
+    # ErrorResponse to a DatabaseError, or the subclass micropg_lite_errors has for its SQLSTATE class
+    import micropg_lite_errors
+    return micropg_lite_errors.database_error(data)
+
+# Millisecond clock of the sibling modules as (ticks, diff): time.ticks_ms() on MicroPython, wraparound included
+_now = (time.ticks_ms, time.ticks_diff) if hasattr(time, 'ticks_ms') else (lambda: int(time.monotonic() * 1000), lambda a, b: a - b)
+
+def _bytea(v):
+    # Hex output format (the default since PostgreSQL 9.0), the escape format is left as it is
+    return binascii.unhexlify(v[2:]) if v[:2] == b'\\x' else bytes(v)
+
+# Converters per type OID taking the raw column bytes, text columns of other types are decoded to str.
+# Add or replace entries for other types, e.g. decoders[114] = json.loads (see README).
+decoders = {16: lambda v: v == b't', 17: _bytea, 21: int, 23: int, 20: int, 26: int, 700: float, 701: float}
+# Array types, micropg_lite_codecs adds their decoders when a result first has such a column
+_array_types = (1000, 1005, 1007, 1009, 1015, 1016, 1021, 1022)
+
+def _array_text(v):
+    # list or tuple to an array literal, micropg_lite_codecs puts its own function in place of this one
+    import micropg_lite_codecs
+    return micropg_lite_codecs.array_text(v)
+
+def _float_text(v):
+    return repr(v) if v - v == 0 else 'NaN' if v != v else 'Infinity' if v > 0 else '-Infinity'
+
+def _bytea_text(v):
+    return '\\x' + binascii.hexlify(v).decode()
+
+def _json_text(v):
+    import json
+    return json.dumps(v)
+
+# Parameter encoders by Python type (exact class), returning the text the server parses; other types go out as str(v),
+# which is also right for int, Decimal and the datetime types. Query parameters of type bytes and bytearray are sent
+# in binary format instead, copy_from() and arrays use the hex bytea text.
+encoders = {bool: lambda v: 't' if v else 'f', float: _float_text, list: _array_text, tuple: _array_text, dict: _json_text,
+            bytes: _bytea_text, bytearray: _bytea_text}
+
+# Statements the server takes $1, $2, ... parameters in; %s in anything else is filled in by the client, see Cursor._parameters()
+_bindable = ('select', 'insert', 'update', 'delete', 'merge', 'values', 'with')
 
 class Cursor:
-    def __init__(self, connection):
+    def __init__(self, connection, stream=0, lazy=False, spool=None, spool_after=8192):
         self.connection = connection
+        self.stream = stream
+        self.lazy = lazy
+        # Rows after the first spool_after bytes go to a micropg_lite_spool.Spool in the file spool
+        self.spool, self.spool_after = spool, spool_after
+        self._spool = None
+        self._spooled = 0
+        self._plan = None
+        self._collect = None
+        self.arraysize = 1
+        self.description = None
+        self._decoders = None
+        self._rowcount = -1
+        self._completed = 0
+        self._parsed = False
+        self._rows = []
+        self._pos = 0
+        self._suspended = False
+        self._portal = ('c%d' % id(self)).encode('ascii')
+        self._copy = None
+        # Results of the statements after the current one of a simple query, see micropg_lite_sets
+        self._sets = None
+        # Taker of the DataRows, set again by _start() in case lazy or spool were changed
+        self._collect = self._collector()
         
     def execute(self, q, a=()):
-        if not self.connection or not bool(self.connection.sock): raiseExceptionLostConnection()
-        self._rows = []
-        if a: q = q.replace('%', '%%').replace('%%s', '%s') % tuple(('NULL' if i is None else "'" + i.replace("'", "''") + "'" if isinstance(i, str) else "'" + ''.join(['\\%03o' % c for c in i]) + "'" for i in a))
+        self._start()
+        if a: q, a = self._parameters(q, a)
+        if a or self.stream or self.connection.binary: self.connection._execute_prepared(q, a, self)
+        else: self._simple(q)
+
+    def execute_batch(self, statements):
+        # All statements in one Query message, so one round trip; a result set per statement, see nextset()
+        self._start()
+        # The separator on a line of its own, so a statement may end in a -- comment
+        self._simple('\n;\n'.join(statements))
+
+    def _simple(self, q):
+        # _sets collects the results of the statements after the first, see _next_set()
+        self._sets = []
         self.connection.execute(q, self)
+        if self._sets:
+            import micropg_lite_sets
+            micropg_lite_sets.first(self)
+
+    def _next_set(self):
+        # RowDescription or CommandComplete of a simple query: the output of the next statement begins when the current
+        # one is complete, micropg_lite_sets puts its result aside
+        if self._sets is not None and self._completed > len(self._sets):
+            import micropg_lite_sets
+            micropg_lite_sets.end_set(self)
+
+    def nextset(self):
+        # Moves to the result of the next statement, None when there is none. Rows left of the current one are dropped.
+        if not self._sets: return None
+        import micropg_lite_sets
+        return micropg_lite_sets.nextset(self)
+
+    def _close_sets(self):
+        for s in self._sets or ():
+            if s[4] is not None: s[4].close()
+        self._sets = None
+
+    def executemany(self, q, seq):
+        self._start()
+        try: self.connection._execute_many(self._placeholders(q), seq, self)
+        except DatabaseError as e:
+            e.parameter_set = self._completed
+            raise
+
+    def _start(self):
+        if not self.connection or not bool(self.connection.sock): raiseExceptionLostConnection()
+        self._rows, self._pos, self.description, self._decoders, self._rowcount, self._completed = [], 0, None, None, -1, 0
+        self._plan = None
+        self._parsed = False
+        self._spool_close()
+        self._close_sets()
+        self._collect = self._collector()
+
+    def _collector(self):
+        # Stream cursors already keep only one batch in RAM and never spool
+        if self.spool and not self.stream:
+            import micropg_lite_spool
+            return lambda data: micropg_lite_spool.collect(self, data)
+        return self._lazy_row if self.lazy else None
+
+    def _row(self, data):
+        # Lazy rows and rows read back from the spool file, built by micropg_lite_rows
+        if self._plan is None or self._plan[0] is not self._decoders:
+            import micropg_lite_rows
+            self._plan = micropg_lite_rows.plan(self)
+        return self._plan[3](self._plan, data)
+
+    def _lazy_row(self, data):
+        self._rows.append(self._row(bytes(data)))
+
+    def _spool_close(self):
+        self._spooled = 0
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+
+    def scroll(self, value, mode='relative'):
+        # Moves within the rows the cursor holds in RAM or in the spool file; rows a stream cursor has not fetched yet are not reachable
+        pos = self._pos + value if mode == 'relative' else value
+        if not 0 <= pos <= len(self._rows) + (len(self._spool) if self._spool else 0): raise IndexError('scroll position out of range')
+        self._pos = pos
+
+    def copy_from(self, table, rows, columns=None, size=8192):
+        # rows is any iterable of tuples (e.g. a generator), encoded to COPY text format and sent in chunks of about size bytes
+        import micropg_lite_copy
+        micropg_lite_copy.copy_from(self, table, rows, columns, size)
+
+    def copy_to(self, query, sink, size=8192):
+        # COPY text format of the query result goes to sink.write() in chunks of about size bytes
+        import micropg_lite_copy
+        micropg_lite_copy.copy_to(self, query, sink, size)
+
+    def _parameters(self, q, a):
+        # A single bindable statement gets $1, $2, ... and the values go out in Bind. SET, CREATE USER ... PASSWORD and
+        # several statements in one string cannot take parameters, there the values are quoted into the SQL as literals.
+        first = q.split(None, 1)
+        if first and first[0].lower() in _bindable and ';' not in q.rstrip().rstrip(';'): return self._placeholders(q), a
+        import micropg_lite_codecs
+        return micropg_lite_codecs.quote(self.connection, q, a), ()
+
+    def _placeholders(self, q):
+        q = q.split('%s')
+        return q[0] + ''.join('$%d%s' % (i, p) for i, p in enumerate(q[1:], 1))
+
+    @property
+    def rowcount(self):
+        return self._rowcount
+
+    def fetchone(self):
+        if self._pos >= len(self._rows):
+            if self._spool:
+                import micropg_lite_spool
+                return micropg_lite_spool.fetchone(self)
+            if not self._suspended: return None
+            self._rows, self._pos = [], 0
+            self.connection._fetch_portal(self)
+            if not self._rows: return None
+        self._pos += 1
+        return self._rows[self._pos - 1]
+
+    def fetchmany(self, size=None):
+        rows = []
+        for _ in range(size or self.arraysize):
+            row = self.fetchone()
+            if row is None: break
+            rows.append(row)
+        return rows
 
     def fetchall(self):
-        rows = self._rows
-        self._rows = []
+        rows = self._rows[self._pos:] if self._pos else self._rows
+        if self._spool:
+            import micropg_lite_spool
+            rows = rows + micropg_lite_spool.rest(self)
+        self._rows, self._pos = [], 0
+        while self._suspended:
+            self.connection._fetch_portal(self)
+            rows.extend(self._rows)
+            self._rows = []
         return rows
 
+    def fetch_columns(self):
+        # Rest of the result as one container per column plus a NULL bitmap per column, see README and micropg_lite_rows
+        import micropg_lite_rows
+        micropg_lite_rows.columns_start(self)
+        while self._suspended: self.connection._fetch_portal(self)
+        return micropg_lite_rows.columns_end(self)
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None: return
+            yield row
+
     def close(self):
+        if self._suspended and self.connection and self.connection.sock:
+            self.connection._send_message(b'C', b'P' + self._portal + b'\x00')
+            self.connection._send_message(b'S', b'')
+            self.connection._process_messages(None)
+            self._suspended = False
+            if self.connection._owner is self: self.connection.commit()
+        self._spool_close()
+        self._close_sets()
         self.connection = None
 
 class connect:
-    def __init__(self, host, user, password, database, port=5432, use_ssl=False):
+    def __init__(self, host, user, password, database, port=5432, use_ssl=False, bufsize=2048, stmt_cache_size=16, binary=False, scram_cache=None,
+                 query_timeout=None, sock=None):
         self.user = user
         self.password = password
         self.database = database
@@ -68,62 +287,103 @@ class connect:
         self.use_ssl = use_ssl
         self.encoding = 'UTF8'
         self.autocommit = False
+        self.binary = binary
+        self.scram_cache = scram_cache
+        # BackendKeyData for cancel(), and the seconds to wait for an answer before the query is cancelled
+        self.backend_pid = None
+        self._backend_key = None
+        self._query_timeout = query_timeout
+        self._cancelled = False
         self._ready_for_query = b'I'
-        
-        # Inlined _open() function
-        self.sock = socket.socket()
-        self.sock.connect(socket.getaddrinfo(self.host, self.port)[0][-1])
-        if self.use_ssl:
-            self._write((8).to_bytes(4, 'big') + (80877103).to_bytes(4, 'big'))
-            if self._read(1) == b'S': self.sock = ssl.wrap_socket(self.sock)
-            else: raiseExceptionLostConnection()
+        self._pending = 0
+        # Who ends the open transaction: None the user (begin(), or BEGIN in SQL), the connection itself, or under
+        # autocommit the stream cursor whose portal needed it, see _begin()
+        self._owner = None
+        # Notifications of listen() channels as (pid, channel, payload), oldest first, and the server's ParameterStatus values
+        self.notifies = []
+        self.parameters = {}
+        # Receive buffer with read-ahead window and coalescing send buffer
+        self._rbuf = bytearray(bufsize)
+        self._rmv = memoryview(self._rbuf)
+        self._rpos = self._rend = 0
+        self._wbuf = bytearray()
+        # Prepared statements by SQL text: [name, description, decoders, result formats], least recently used first in
+        # _stmt_lru, see micropg_lite_stmts
+        self.stmt_cache_size = stmt_cache_size
+        self._stmt_cache = {}
+        self._stmt_lru = []
+        self._stmt_seq = 0
+        # Traffic counters and query callbacks, only after instrument()
+        self.on_query_start = self.on_query_end = None
+        self._counters = None
+        self._tracing = False
+        # SELECT results kept by cache_results()
+        self.result_cache = None
+        # An already connected socket (or any object with recv_into()/recv()/readinto() and send()/write()) to log in over
+        # instead of opening one to host:port, e.g. a tunnel or the scripted sockets of development_testfiles
+        self.sock = sock
+        self._open()
+
+    def _open(self):
+        if self.sock: self._set_socket(self.sock)
+        else:
+            self._set_socket(socket.socket())
+            self.sock.connect(socket.getaddrinfo(self.host, self.port)[0][-1])
+            if self.use_ssl:
+                self._write((8).to_bytes(4, 'big') + (80877103).to_bytes(4, 'big'))
+                import ssl
+                if self._read(1) == b'S': self._set_socket(ssl.wrap_socket(self.sock))
+                else: raiseExceptionLostConnection()
+        self._write(self._startup_message())
+        self._process_messages(None)
+        if self._query_timeout: self.query_timeout = self._query_timeout
+
+    def _startup_message(self):
         v = b'\x00\x03\x00\x00user\x00' + self.user.encode('ascii') + b'\x00'
         if self.database: v += b'database\x00' + self.database.encode('ascii') + b'\x00'
         v += b'\x00'
-        self._write((len(v) + 4).to_bytes(4, 'big') + v)
-        self._process_messages(None)
+        return (len(v) + 4).to_bytes(4, 'big') + v
+
+    def _set_socket(self, sock):
+        # MicroPython readinto() never returns short reads, so read-ahead is only safe with recv_into()/recv()
+        self.sock = sock
+        self._short_reads = hasattr(sock, 'recv_into') or hasattr(sock, 'recv')
+        self._recv_into = getattr(sock, 'recv_into', None) or (self._recv_copy if hasattr(sock, 'recv') else sock.readinto)
+        self._send = getattr(sock, 'write', None) or sock.send
+
+    def _recv_copy(self, mv):
+        chunk = self.sock.recv(len(mv))
+        mv[:len(chunk)] = chunk
+        return len(chunk)
 
     def _send_message(self, message, data):
-        self._write(b''.join([message, (len(data) + 4).to_bytes(4, 'big'), data, b'H\x00\x00\x00\x04']))
+        self._wbuf += message
+        self._wbuf += (len(data) + 4).to_bytes(4, 'big')
+        self._wbuf += data
 
     def _process_messages(self, obj):
+        self._flush()
+        if self._pending: self._process_pending()
+        error = None
         while True:
-            try: code = ord(self._read(1))
+            try: code, data = self._read_message()
             except: raiseExceptionLostConnection()
-            data = self._read(int.from_bytes(self._read(4), 'big') - 4)
             if code == 90: 
-                self._ready_for_query = data
+                self._ready_for_query = bytes(data)
                 break
-            elif code == 82:
-                nonce = str(random.getrandbits(32))
-                first = f'n,,n=,r={nonce}'.encode('utf-8')
-                msg = b'SCRAM-SHA-256\x00' + (len(first)).to_bytes(4, 'big') + first
-                self._write(b'p' + (len(msg) + 4).to_bytes(4, 'big') + msg)
-                assert ord(self._read(1)) == 82
-                data = self._read(int.from_bytes(self._read(4), 'big') - 4)
-                server = dict(kv.split('=', 1) for kv in data[4:].decode('utf-8').split(','))
-                pw_bytes = self.password.encode('utf-8')
-                iters = int(server['i'])
-                u1 = hmac_sha256_digest(pw_bytes, binascii.a2b_base64(server['s']) + b'\x00\x00\x00\x01')
-                ui = int.from_bytes(u1, 'big')
-                for _ in range(iters - 1):
-                    u1 = hmac_sha256_digest(pw_bytes, u1)
-                    ui ^= int.from_bytes(u1, 'big') 
-                client_key = hmac_sha256_digest(ui.to_bytes(32, 'big'), b"Client Key")
-                auth_msg = f"n=,r={nonce},r={server['r']},s={server['s']},i={server['i']},c=biws,r={server['r']}"
-                proof = binascii.b2a_base64(bytes(x ^ y for x, y in zip(client_key, hmac_sha256_digest(hashlib.sha256(client_key).digest(), auth_msg.encode('utf-8'))))).rstrip(b'\n')
-                final = f"c=biws,r={server['r']},p={proof.decode('utf-8')}".encode('utf-8')
-                self._write(b'p' + (len(final) + 4).to_bytes(4, 'big') + final)
-                for _ in range(3):
-                    assert ord(self._read(1)) == 82
-                    data = self._read(int.from_bytes(self._read(4), 'big') - 4)
-                    if int.from_bytes(data[:4], 'big') == 0: break
+            elif code == 82: self._authenticate(data)
+            elif code == 115 and obj: obj._suspended = True
             elif code == 67 and obj:
-                parts = data[:-1].decode('ascii').split()
-                if parts and parts[-1].isdigit(): obj._rowcount = int(parts[-1])
+                obj._next_set()
+                parts = str(data[:-1], 'ascii').split()
+                if parts and parts[-1].isdigit(): obj._rowcount = max(obj._rowcount, 0) + int(parts[-1])
+                obj._completed += 1
             elif code == 84 and obj:
+                obj._next_set()
+                data = bytes(data)
                 count = int.from_bytes(data[:2], 'big')
                 obj.description = [None] * count
+                obj._decoders = [None] * count
                 n = 2
                 for i in range(count):
                     name_end = data.index(b'\x00', n)
@@ -134,93 +394,274 @@ class connect:
                     type_code = int.from_bytes(data[n+6:n+10], 'big')
                     size, precision, scale = int.from_bytes(data[n+10:n+12], 'big'), -1, -1
                     obj.description[i] = (name, type_code, None, size, precision, scale, None)
+                    conv = decoders.get(type_code)
+                    if data[n+17] or conv is None and type_code in _array_types:
+                        import micropg_lite_codecs
+                        conv = (micropg_lite_codecs.binary_decoders if data[n+17] else decoders).get(type_code)
+                    obj._decoders[i] = conv
                     n += 18
+                obj._decoders = tuple(obj._decoders)
             elif code == 68 and obj:
-                n, row = 2, []
-                while n < len(data):
-                    if data[n:n+4] == b'\xff\xff\xff\xff': row.append(None); n += 4
+                # Lazy rows and columnar fetches take the DataRow themselves
+                if obj._collect:
+                    obj._collect(data)
+                    continue
+                data, n, row, enc = bytes(data), 2, [], self.encoding
+                for conv in obj._decoders:
+                    ln = struct.unpack_from('!i', data, n)[0]
+                    n += 4
+                    if ln < 0: row.append(None)
+                    elif conv.__class__ is str:
+                        row.append(struct.unpack_from(conv, data, n)[0])
+                        n += ln
                     else:
-                        ln = int.from_bytes(data[n:n+4], 'big')
-                        col_data = data[n+4:n+4+ln]
-                        col_oid = obj.description[len(row)][1]
-                        decoded_data = col_data.decode(self.encoding) if col_data else None
-                        if col_oid == 16: decoded_data = (decoded_data == 't')
-                        elif col_oid in (21, 23, 20, 26): decoded_data = int(decoded_data)
-                        elif col_oid in (700, 701): decoded_data = float(decoded_data)
-                        row.append(decoded_data)
-                        n += ln + 4
+                        v = data[n:n+ln]
+                        n += ln
+                        row.append(conv(v) if conv else v.decode(enc))
                 obj._rows.append(tuple(row))
-            elif code == 69: raiseExceptionLostConnection()
-            elif code == 100: obj.write(data)
-            elif code == 71:
-                while True:
-                    buf = obj.read(8192)
-                    if not buf: break
-                    self._write(b'd' + (len(buf) + 4).to_bytes(4, 'big') + buf)
-                self._write(b'c\x00\x00\x00\x04S\x00\x00\x00\x04')
-                
+            elif code == 69:
+                # The server skips the rest up to ReadyForQuery, which is read before raising, so the connection stays usable.
+                # FATAL ends the session (a failed login, a terminated backend) without ReadyForQuery.
+                error = _database_error(data)
+                if error.severity in ('FATAL', 'PANIC'):
+                    self.sock.close()
+                    self.sock = None
+                    raise error
+            elif code == 49 and obj: obj._parsed = True
+            elif code == 65 or code == 83: self._unsolicited(code, data)
+            elif code == 75:
+                self._backend_key = bytes(data)
+                self.backend_pid = int.from_bytes(data[:4], 'big')
+            elif code == 100: obj._copy.write(data)
+            elif code == 71: obj._copy.send(self)
+        if error: raise error
+
+    def _unsolicited(self, code, data):
+        # NotificationResponse and ParameterStatus, which the server may send at any time
+        parts = bytes(data[4:] if code == 65 else data).split(b'\x00')
+        if code == 65: self.notifies.append((int.from_bytes(data[:4], 'big'), parts[0].decode(self.encoding), parts[1].decode(self.encoding)))
+        else: self.parameters[parts[0].decode()] = parts[1].decode()
+
+    def _authenticate(self, data):
+        # One step per Authentication message: 0 ok, 3 cleartext password, 10 to 12 SASL in micropg_lite_scram
+        kind = int.from_bytes(data[:4], 'big')
+        if 10 <= kind <= 12:
+            import micropg_lite_scram
+            micropg_lite_scram.authenticate(self, kind, data[4:])
+        elif kind == 3: self._send_message(b'p', self.password.encode('utf-8') + b'\x00')
+        elif kind == 0:
+            # A server that skips the SCRAM signature (SASLFinal) has not proven it knows the password
+            if getattr(self, '_scram', None) is not None: raise Exception('28000:Authentication ended before the SCRAM exchange')
+            return
+        else: raise Exception('28000:Unsupported authentication method %d' % kind)
+        self._flush()
+
+    def _fill(self, ln):
+        if self._rpos == self._rend: self._rpos = self._rend = 0
+        elif self._rpos + ln > len(self._rbuf):
+            self._rbuf[:self._rend - self._rpos] = self._rbuf[self._rpos:self._rend]
+            self._rend -= self._rpos
+            self._rpos = 0
+        while self._rend - self._rpos < ln:
+            try: n = self._recv_into(self._rmv[self._rend:] if self._short_reads else self._rmv[self._rend:self._rpos + ln])
+            except OSError as e:
+                self._timed_out(e)
+                continue
+            if not n: raiseExceptionLostConnection()
+            self._rend += n
+
     def _read(self, ln):
         if not self.sock: raiseExceptionLostConnection()
-        r = bytearray(ln)
-        pos = 0
-        while pos < ln:
-            chunk = self.sock.read(ln - pos) if hasattr(self.sock, "read") else self.sock.recv(ln - pos)
-            if not chunk: raiseExceptionLostConnection()
-            r[pos:pos+len(chunk)] = chunk
-            pos += len(chunk)
-        return bytes(r)
+        self._fill(ln)
+        self._rpos += ln
+        return bytes(self._rmv[self._rpos - ln:self._rpos])
+
+    def _read_message(self):
+        # Returns a memoryview into the receive buffer, only valid until the next read
+        if not self.sock: raiseExceptionLostConnection()
+        self._fill(5)
+        b, p = self._rbuf, self._rpos
+        code, ln = b[p], ((b[p+1] << 24) | (b[p+2] << 16) | (b[p+3] << 8) | b[p+4]) - 4
+        self._rpos = p + 5
+        if ln > len(b):
+            data = memoryview(bytearray(ln))
+            pos = self._rend - self._rpos
+            data[:pos] = self._rmv[self._rpos:self._rend]
+            self._rpos = self._rend = 0
+            while pos < ln:
+                try: n = self._recv_into(data[pos:])
+                except OSError as e:
+                    self._timed_out(e)
+                    continue
+                if not n: raiseExceptionLostConnection()
+                pos += n
+            return code, data
+        self._fill(ln)
+        self._rpos += ln
+        return code, self._rmv[self._rpos - ln:self._rpos]
 
     def _write(self, b):
         if not self.sock:
             raiseExceptionLostConnection()
-        pos = 0
+        self._cancelled = False
+        mv, pos = memoryview(b), 0
         while pos < len(b):
-            pos += self.sock.write(b[pos:]) if hasattr(self.sock, "write") else self.sock.send(b[pos:])
+            try: pos += self._send(mv[pos:])
+            except OSError:
+                # A send that timed out or failed may have left half a message, the server would read the rest as garbage
+                self.sock.close()
+                self.sock = None
+                raiseExceptionLostConnection()
+
+    def _flush(self):
+        if self._wbuf:
+            self._write(self._wbuf)
+            self._wbuf = bytearray()
+
+    @property
+    def query_timeout(self):
+        return self._query_timeout
+
+    @query_timeout.setter
+    def query_timeout(self, seconds):
+        # An answer not complete this many seconds after the query was sent (None: no limit) cancels the query; the reads go
+        # on, so the query fails with SQLSTATE 57014 and the connection stays usable. No answer within another query_timeout
+        # closes the connection. The clock is kept by micropg_lite_cancel.
+        self._query_timeout = seconds
+        if getattr(self.sock, 'settimeout', None):
+            import micropg_lite_cancel
+            micropg_lite_cancel.deadline(self, seconds)
+
+    def _timed_out(self, e):
+        # A failed read, the first timeout cancels the query, see micropg_lite_cancel
+        if not self._query_timeout: raise e
+        import micropg_lite_cancel
+        micropg_lite_cancel.timed_out(self, e)
+
+    def cancel(self):
+        # CancelRequest on a side connection: the query this connection runs fails with SQLSTATE 57014.
+        # Can be called from another thread; a cancel that arrives between two queries has no effect.
+        import micropg_lite_cancel
+        micropg_lite_cancel.cancel(self)
+
+    def instrument(self, on_query_start=None, on_query_end=None):
+        # Counts from now on and calls on_query_start(sql) and on_query_end(info) around every query, see micropg_lite_stats
+        import micropg_lite_stats
+        micropg_lite_stats.instrument(self, on_query_start, on_query_end)
+
+    @property
+    def stats(self):
+        # Totals since instrument(), None before
+        return dict(self._counters) if self._counters else None
+
+    def cache_results(self, ttl=60, max_entries=32, max_bytes=16384):
+        # Repeated SELECTs are answered from RAM for ttl seconds, until this connection writes to one of their tables,
+        # see micropg_lite_cache. Returns the cache (hits, misses, clear(), invalidate(table), ...).
+        import micropg_lite_cache
+        return micropg_lite_cache.cache_results(self, ttl, max_entries, max_bytes)
 
-    def cursor(self):
-        return Cursor(self)
+    def cursor(self, stream=0, lazy=False, spool=None, spool_after=8192):
+        return Cursor(self, stream, lazy, spool, spool_after)
+
+    def listen(self, channel):
+        # LISTEN, UNLISTEN and the wait for notifications are in micropg_lite_notify
+        import micropg_lite_notify
+        micropg_lite_notify.listen(self, channel)
+
+    def unlisten(self, channel='*'):
+        import micropg_lite_notify
+        micropg_lite_notify.unlisten(self, channel)
+
+    def wait_for_notify(self, timeout=None):
+        # Next notification from notifies, waiting up to timeout seconds (None: forever) for one to arrive; None on timeout
+        if self.notifies: return self.notifies.pop(0)
+        import micropg_lite_notify
+        return micropg_lite_notify.wait_for_notify(self, timeout)
 
     def execute(self, query, obj=None):
-        if self._ready_for_query != b'T':
-            self.begin()
+        commit = self._begin()
         self._send_message(b'Q', query.encode(self.encoding) + b'\x00')
         self._process_messages(obj)
-        if self.autocommit:
-            self.commit()
+        if commit: self.commit()
 
-    def begin(self):
+    def _execute_prepared(self, query, params, obj):
+        # Parse/Bind/Execute, the prepared statements are kept by SQL text in micropg_lite_stmts
+        import micropg_lite_stmts
+        micropg_lite_stmts.execute_prepared(self, query, params, obj)
+
+    def _execute_many(self, query, seq, obj):
+        # Bind/Execute for every parameter set behind one Parse, see micropg_lite_stmts
+        import micropg_lite_stmts
+        micropg_lite_stmts.execute_many(self, query, seq, obj)
+
+    def _fetch_portal(self, obj):
+        obj._suspended = False
+        self._send_message(b'E', (obj._portal if obj.stream else b'') + b'\x00' + obj.stream.to_bytes(4, 'big'))
+        self._send_message(b'S', b'')
+        self._process_messages(obj)
+        if self._owner is obj and not obj._suspended: self.commit()
+
+    def _begin(self, force=False):
+        # BEGIN, and the ROLLBACK of a failed transaction, ride in front of the next statement instead of costing a round trip.
+        # With autocommit no transaction control is sent unless a batch (force True) or the portal of a stream cursor
+        # (force is the cursor) needs one. Returns True when autocommit is on and the caller has to commit after the
+        # statement: the transaction is the batch's, the stream cursor's, or one left open from before autocommit was set.
         if self._ready_for_query == b'E':
-            self._rollback()
-        self._send_message(b'Q', b"BEGIN\x00")
-        self._process_messages(None)
+            self._send_message(b'Q', b"ROLLBACK\x00")
+            self._pending += 1
+            self._ready_for_query = b'I'
+        if self._ready_for_query == b'I':
+            self._owner = None
+            if self.autocommit and not force: return False
+            self._send_message(b'Q', b"BEGIN\x00")
+            self._pending += 1
+            self._ready_for_query = b'T'
+            self._owner = force if self.autocommit and force is not True else self
+            return self.autocommit
+        if not self.autocommit or self._owner is None: return False
+        # A stream cursor's transaction must not take in other statements, it would only commit them once the stream is done
+        if self._owner is not self and self._owner is not force:
+            raise Exception('25001:An autocommit stream cursor has a transaction open, fetch all its rows or close it first')
+        if force and force is not True: self._owner = force
+        return True
+
+    def _process_pending(self):
+        pending, self._pending = self._pending, 0
+        for _ in range(pending):
+            self._process_messages(None)
+
+    def begin(self):
+        # The transaction is the user's from now on, also under autocommit: it ends with commit() or rollback()
+        self._begin(True)
+        self._owner = None
+        self._process_pending()
 
     def commit(self):
-        if self.sock:
+        if self.sock and self._ready_for_query != b'I':
             self._send_message(b'Q', b"COMMIT\x00")
             self._process_messages(None)
-            self.begin()
 
-    def _rollback(self):
-        if self.sock:
+    def rollback(self):
+        if self.sock and self._ready_for_query != b'I':
             self._send_message(b'Q', b"ROLLBACK\x00")
             self._process_messages(None)
 
-    def rollback(self):
-        self._rollback()
-        self.begin()
-
     def close(self):
         if self.sock:
-            self._write(b'X\x00\x00\x00\x04')
+            self._wbuf += b'X\x00\x00\x00\x04'
+            self._flush()
             self.sock.close()
             self.sock = None
 
-def create_database(host, user, password, database, port=5432, use_ssl=False):
-    conn = connect(host, user, password, None, port, use_ssl)
-    conn._send_message(b'Q', 'CREATE DATABASE {}'.format(database).encode('utf-8') + b'\x00')
-    conn.close()
+# Features in the sibling modules micropg_lite_*.py are imported on first use, so only the ones a program uses take RAM.
+# On a MicroPython build without module __getattr__, import them from their module, e.g. from micropg_lite_async import AsyncConnection.
+_lazy = {'AsyncConnection': 'micropg_lite_async', 'AsyncCursor': 'micropg_lite_async', 'ConnectionPool': 'micropg_lite_pool',
+         'BatchWriter': 'micropg_lite_batch', 'Row': 'micropg_lite_rows', 'column_types': 'micropg_lite_rows',
+         'binary_decoders': 'micropg_lite_codecs', 'DataError': 'micropg_lite_errors', 'IntegrityError': 'micropg_lite_errors',
+         'OperationalError': 'micropg_lite_errors', 'ProgrammingError': 'micropg_lite_errors', 'error_classes': 'micropg_lite_errors',
+         'create_database': 'micropg_lite_admin', 'drop_database': 'micropg_lite_admin',
+         'hmac_sha256_digest': 'micropg_lite_scram', 'salted_password': 'micropg_lite_scram'}
 
-def drop_database(host, user, password, database, port=5432, use_ssl=False):
-    conn = connect(host, user, password, None, port, use_ssl)
-    conn._send_message(b'Q', 'DROP DATABASE {}'.format(database).encode('utf-8') + b'\x00')
-    conn.close()
\ No newline at end of file
+def __getattr__(name):
+    if name in _lazy: return getattr(__import__(_lazy[name]), name)
+    raise AttributeError(name)
@@ -0,0 +1,14 @@
+# CREATE and DROP DATABASE helpers for micropg_lite, loaded on first use of micropg_lite.create_database/drop_database.
+# Part of micropg_lite (MIT License, see micropg_lite.py): https://github.com/TimonW-Dev/micropg_lite
+
+from micropg_lite import connect
+
+def create_database(host, user, password, database, port=5432, use_ssl=False):
+    conn = connect(host, user, password, None, port, use_ssl)
+    conn._send_message(b'Q', 'CREATE DATABASE {}'.format(database).encode('utf-8') + b'\x00')
+    conn.close()
+
+def drop_database(host, user, password, database, port=5432, use_ssl=False):
+    conn = connect(host, user, password, None, port, use_ssl)
+    conn._send_message(b'Q', 'DROP DATABASE {}'.format(database).encode('utf-8') + b'\x00')
+    conn.close()
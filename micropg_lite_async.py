@@ -0,0 +1,379 @@
+# AsyncConnection and AsyncCursor for micropg_lite, loaded on first use of micropg_lite.AsyncConnection.
+# Part of micropg_lite (MIT License, see micropg_lite.py): https://github.com/TimonW-Dev/micropg_lite
+
+from micropg_lite import connect, Cursor, DatabaseError, raiseExceptionLostConnection, _database_error
+
+try: import asyncio
+except ImportError: import uasyncio as asyncio
+
+class AsyncConnection(connect):
+    # connect on asyncio streams (uasyncio on MicroPython). Messages are built and parsed by the connect methods,
+    # only sending and waiting for the complete reply is done here, so other coroutines run while the server works.
+    # One query at a time per connection, use several connections to overlap queries.
+    def _open(self):
+        self._inbox, self._inpos, self._scan = bytearray(), 0, 0
+
+    async def open(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        if self.use_ssl:
+            self._writer.write((8).to_bytes(4, 'big') + (80877103).to_bytes(4, 'big'))
+            await self._writer.drain()
+            if await self._reader.read(1) != b'S': raiseExceptionLostConnection()
+            if not hasattr(self._writer, 'start_tls'): raise Exception('08001:use_ssl needs StreamWriter.start_tls (CPython 3.11+)')
+            import ssl
+            context = ssl.create_default_context()
+            context.check_hostname, context.verify_mode = False, ssl.CERT_NONE
+            await self._writer.start_tls(context)
+        self.sock = self._writer
+        self._write(self._startup_message())
+        # Authentication requests are answered one at a time, the rest up to ReadyForQuery is parsed as usual
+        while True:
+            await self._receive(None, 1)
+            code = self._inbox[self._inpos]
+            if code != 82: break
+            self._authenticate(self._read_message()[1])
+        self._scan = self._inpos
+        # A failed login is not followed by ReadyForQuery
+        if code == 69: self._process_messages(None)
+        await self._process(None)
+        return self
+
+    def cursor(self, stream=0, lazy=False, spool=None, spool_after=8192):
+        return AsyncCursor(self, stream, lazy, spool, spool_after)
+
+    def _traced(self, method, sql):
+        # Coroutine version of micropg_lite_stats.traced()
+        import micropg_lite_stats as stats
+        async def run(*args):
+            if stats.skip(self, sql): return await method(*args)
+            start = stats.trace_start(self, sql or args[0])
+            try: result = await method(*args)
+            except Exception as e:
+                stats.trace_end(self, start, e)
+                raise
+            stats.trace_end(self, start, None)
+            return result
+        return run
+
+    def _cached(self, method, many):
+        # Coroutine version of micropg_lite_cache.cached()
+        import micropg_lite_cache as cache
+        async def run(query, *args):
+            params, obj = cache.arguments(args, many)
+            key = self.result_cache.begin(self, query, params, obj)
+            if key is cache._hit: return
+            result = await method(query, *args)
+            if key: self.result_cache.store(key, obj)
+            return result
+        return run
+
+    def _write(self, b):
+        if not self.sock: raiseExceptionLostConnection()
+        self._writer.write(b)
+
+    def _read_message(self):
+        # Only called for messages _receive() has seen complete. The memoryview stays valid, _receive() never resizes a read inbox.
+        pos = self._inpos
+        self._inpos = pos + 1 + int.from_bytes(self._inbox[pos + 1:pos + 5], 'big')
+        return self._inbox[pos], memoryview(self._inbox)[pos + 5:self._inpos]
+
+    async def _receive(self, stops, count):
+        # Reads until count more messages with a code in stops (any code for None) are complete in the inbox
+        await self._writer.drain()
+        if self._inpos:
+            self._inbox = self._inbox[self._inpos:]
+            self._scan -= self._inpos
+            self._inpos = 0
+        inbox, pos = self._inbox, self._scan
+        while count > 0:
+            while count > 0 and pos + 5 <= len(inbox):
+                end = pos + 1 + int.from_bytes(inbox[pos + 1:pos + 5], 'big')
+                if end > len(inbox): break
+                if stops is None or inbox[pos] in stops: count -= 1
+                pos = end
+            if count > 0:
+                chunk = await self._reader.read(len(self._rbuf))
+                if not chunk: raiseExceptionLostConnection()
+                inbox += chunk
+        self._scan = pos
+
+    async def _process(self, obj):
+        # connect._process_messages() once the replies to the queued BEGIN/ROLLBACK and to the query itself are complete.
+        # A COPY FROM STDIN gets its rows sent first, see _copy_in().
+        if obj is not None and hasattr(obj._copy, 'send'): return await self._copy_in(obj)
+        await self._wait(b'Z')
+        self._process_messages(obj)
+
+    async def _wait(self, stops):
+        # Until the inbox holds the replies to the queued BEGIN/ROLLBACK and one more message with a code in stops
+        self._flush()
+        if not self._query_timeout: await self._receive(stops, self._pending + 1)
+        else:
+            # _receive() picks up where the timeout left it, so after cancel() the wait for the error goes on
+            try: await asyncio.wait_for(self._receive(stops, self._pending + 1), self._query_timeout)
+            except asyncio.TimeoutError:
+                # As in micropg_lite_cancel.timed_out(), a failed cancel still leaves the second wait
+                try: await self.cancel()
+                except Exception: pass
+                try: await asyncio.wait_for(self._receive(stops, self._pending + 1), self._query_timeout)
+                except asyncio.TimeoutError:
+                    self.sock = None
+                    self._writer.close()
+                    raiseExceptionLostConnection()
+
+    async def _copy_in(self, obj):
+        # Coroutine version of micropg_lite_copy.CopyIn.send(): the rows go out once the server has answered with
+        # CopyInResponse, a chunk at a time with a drain in between, so the row source is not read ahead of the network
+        await self._wait(b'GZ')
+        self._process_pending()
+        # An error instead of CopyInResponse is raised as for any query
+        if self._inbox[self._inpos] != 71: return self._process_messages(obj)
+        self._read_message()
+        try:
+            for chunk in obj._copy._chunks(self.encoding):
+                self._flush()
+                await self._writer.drain()
+                self._send_message(b'd', chunk)
+        except Exception as e:
+            self._wbuf = bytearray()
+            self._send_message(b'f', str(e).encode(self.encoding) + b'\x00')
+            await self._wait(b'Z')
+            while True:
+                code, data = self._read_message()
+                if code == 90: break
+            self._ready_for_query = bytes(data)
+            raise
+        self._wbuf += b'c\x00\x00\x00\x04'
+        await self._wait(b'Z')
+        self._process_messages(obj)
+
+    async def cancel(self):
+        # Coroutine version of connect.cancel(), the side connection is an asyncio stream so other tasks keep running
+        if not self._backend_key: return
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), 10)
+        try:
+            writer.write((16).to_bytes(4, 'big') + (80877102).to_bytes(4, 'big') + self._backend_key)
+            await writer.drain()
+            # The server closes the side connection once it has passed the request on
+            await asyncio.wait_for(reader.read(1), 10)
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    async def execute(self, query, obj=None):
+        commit = self._begin()
+        self._send_message(b'Q', query.encode(self.encoding) + b'\x00')
+        await self._process(obj)
+        if commit: await self.commit()
+
+    async def _prepare(self, query, obj):
+        import micropg_lite_stmts
+        stmt, new = micropg_lite_stmts.parse(self, query, obj)
+        if new and self.binary:
+            self._send_message(b'S', b'')
+            await self._process(obj)
+            import micropg_lite_codecs
+            micropg_lite_codecs.binary_formats(stmt, obj)
+        return stmt
+
+    async def _execute_prepared(self, query, params, obj):
+        import micropg_lite_stmts
+        values = micropg_lite_stmts.bind_values(self, params)
+        commit = self._begin(obj.stream and obj)
+        stmt = await self._prepare(query, obj)
+        if obj.stream: self._send_message(b'C', b'P' + obj._portal + b'\x00')
+        micropg_lite_stmts.send_bind(self, obj._portal if obj.stream else b'', stmt[0], values, stmt[3])
+        try: await self._fetch_portal(obj)
+        except DatabaseError as e:
+            micropg_lite_stmts.stale(self, stmt, obj, e)
+            raise
+        finally: micropg_lite_stmts.keep(self, query, stmt, obj)
+        if commit and not obj.stream: await self.commit()
+
+    async def _execute_many(self, query, seq, obj):
+        commit = self._begin(True)
+        import micropg_lite_stmts
+        stmt = await self._prepare(query, obj)
+        try:
+            try:
+                for params in seq:
+                    micropg_lite_stmts.send_bind(self, b'', stmt[0], micropg_lite_stmts.bind_values(self, params), stmt[3])
+                    self._send_message(b'E', b'\x00\x00\x00\x00\x00')
+                    if len(self._wbuf) >= 8192:
+                        self._send_message(b'S', b'')
+                        await self._process(obj)
+            except:
+                # See micropg_lite_stmts.execute_many()
+                if self._wbuf and self.sock:
+                    self._send_message(b'S', b'')
+                    await self._process(obj)
+                    await self.rollback()
+                raise
+            self._send_message(b'S', b'')
+            await self._process(obj)
+        except DatabaseError as e:
+            micropg_lite_stmts.stale(self, stmt, obj, e)
+            raise
+        finally: micropg_lite_stmts.keep(self, query, stmt, obj)
+        if commit: await self.commit()
+
+    async def _fetch_portal(self, obj):
+        obj._suspended = False
+        self._send_message(b'E', (obj._portal if obj.stream else b'') + b'\x00' + obj.stream.to_bytes(4, 'big'))
+        self._send_message(b'S', b'')
+        await self._process(obj)
+        if self._owner is obj and not obj._suspended: await self.commit()
+
+    async def listen(self, channel):
+        import micropg_lite_notify
+        self._send_message(b'Q', micropg_lite_notify.channel_query(self, 'LISTEN ', channel))
+        await self._process(None)
+
+    async def unlisten(self, channel='*'):
+        import micropg_lite_notify
+        self._send_message(b'Q', micropg_lite_notify.channel_query(self, 'UNLISTEN ', channel))
+        await self._process(None)
+
+    async def wait_for_notify(self, timeout=None):
+        # Coroutine version of connect.wait_for_notify(), other tasks run while it waits
+        if not self.notifies:
+            try: await (self._receive(b'A', 1) if timeout is None else asyncio.wait_for(self._receive(b'A', 1), timeout))
+            except asyncio.TimeoutError: pass
+            # Only complete messages are taken from the inbox, a notification cut off by the timeout stays for the next read
+            while self._inpos < self._scan:
+                code, data = self._read_message()
+                if code == 69:
+                    self.sock = None
+                    self._writer.close()
+                    raise _database_error(data)
+                if code == 65 or code == 83: self._unsolicited(code, data)
+        return self.notifies.pop(0) if self.notifies else None
+
+    async def begin(self):
+        self._begin(True)
+        self._owner = None
+        pending, self._pending = self._pending, 0
+        for _ in range(pending): await self._process(None)
+
+    async def commit(self):
+        if self.sock and self._ready_for_query != b'I':
+            self._send_message(b'Q', b"COMMIT\x00")
+            await self._process(None)
+
+    async def rollback(self):
+        if self.sock and self._ready_for_query != b'I':
+            self._send_message(b'Q', b"ROLLBACK\x00")
+            await self._process(None)
+
+    async def close(self):
+        if self.sock:
+            self._wbuf += b'X\x00\x00\x00\x04'
+            self._flush()
+            self.sock = None
+            self._writer.close()
+            await self._writer.wait_closed()
+
+class AsyncCursor(Cursor):
+    # Cursor of an AsyncConnection, everything that may wait for the server is a coroutine
+    async def execute(self, q, a=()):
+        self._start()
+        if a: q, a = self._parameters(q, a)
+        if a or self.stream or self.connection.binary: await self.connection._execute_prepared(q, a, self)
+        else: await self._simple(q)
+
+    async def execute_batch(self, statements):
+        self._start()
+        await self._simple('\n;\n'.join(statements))
+
+    async def _simple(self, q):
+        self._sets = []
+        await self.connection.execute(q, self)
+        if self._sets:
+            import micropg_lite_sets
+            micropg_lite_sets.first(self)
+
+    async def executemany(self, q, seq):
+        self._start()
+        try: await self.connection._execute_many(self._placeholders(q), seq, self)
+        except DatabaseError as e:
+            e.parameter_set = self._completed
+            raise
+
+    async def fetchone(self):
+        if self._pos >= len(self._rows):
+            if self._spool:
+                import micropg_lite_spool
+                return micropg_lite_spool.fetchone(self)
+            if not self._suspended: return None
+            self._rows, self._pos = [], 0
+            await self.connection._fetch_portal(self)
+            if not self._rows: return None
+        self._pos += 1
+        return self._rows[self._pos - 1]
+
+    async def fetchmany(self, size=None):
+        rows = []
+        for _ in range(size or self.arraysize):
+            row = await self.fetchone()
+            if row is None: break
+            rows.append(row)
+        return rows
+
+    async def fetchall(self):
+        rows = self._rows[self._pos:] if self._pos else self._rows
+        if self._spool:
+            import micropg_lite_spool
+            rows = rows + micropg_lite_spool.rest(self)
+        self._rows, self._pos = [], 0
+        while self._suspended:
+            await self.connection._fetch_portal(self)
+            rows.extend(self._rows)
+            self._rows = []
+        return rows
+
+    def __aiter__(self):
+        return self
+
+    async def fetch_columns(self):
+        import micropg_lite_rows
+        micropg_lite_rows.columns_start(self)
+        while self._suspended: await self.connection._fetch_portal(self)
+        return micropg_lite_rows.columns_end(self)
+
+    async def __anext__(self):
+        row = await self.fetchone()
+        if row is None: raise StopAsyncIteration
+        return row
+
+    def __iter__(self):
+        # fetchone() is a coroutine, Cursor.__iter__() would hand out coroutines instead of rows
+        raise TypeError("'AsyncCursor' object is not iterable, use async for")
+
+    async def copy_from(self, table, rows, columns=None, size=8192):
+        # See Cursor.copy_from(), the rows are sent by AsyncConnection._copy_in()
+        import micropg_lite_copy
+        await self._copy_query(micropg_lite_copy.from_query(table, columns), micropg_lite_copy.CopyIn(rows, size))
+
+    async def copy_to(self, query, sink, size=8192):
+        # See Cursor.copy_to(); like every reply, the COPY output is complete in RAM before it goes to sink
+        import micropg_lite_copy
+        copy = micropg_lite_copy.CopyOut(sink, size)
+        await self._copy_query('COPY (%s) TO STDOUT' % query, copy)
+        copy.flush()
+
+    async def _copy_query(self, q, copy):
+        self._start()
+        self._copy = copy
+        try: await self.connection.execute(q, self)
+        finally: self._copy = None
+
+    async def close(self):
+        if self._suspended and self.connection and self.connection.sock:
+            self.connection._send_message(b'C', b'P' + self._portal + b'\x00')
+            self.connection._send_message(b'S', b'')
+            await self.connection._process(None)
+            self._suspended = False
+            if self.connection._owner is self: await self.connection.commit()
+        self._spool_close()
+        self._close_sets()
+        self.connection = None
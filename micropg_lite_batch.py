@@ -0,0 +1,169 @@
+# BatchWriter for micropg_lite, loaded on first use of micropg_lite.BatchWriter.
+# Part of micropg_lite (MIT License, see micropg_lite.py): https://github.com/TimonW-Dev/micropg_lite
+
+from micropg_lite import connect, _now
+from micropg_lite_copy import CopyIn, _copy_text, _copy_query
+
+def _line(row):
+    return ('\t'.join([_copy_text(v) for v in row]) + '\n').encode('utf-8')
+
+def _unescape(v):
+    if v == '\\N': return None
+    if '\\' not in v: return v
+    out, i = [], 0
+    while i < len(v):
+        c = v[i]
+        if c == '\\' and i + 1 < len(v):
+            i += 1
+            c = {'t': '\t', 'n': '\n', 'r': '\r'}.get(v[i], v[i])
+        out.append(c)
+        i += 1
+    return ''.join(out)
+
+class _Lines(CopyIn):
+    # CopyIn for rows that are COPY text lines already
+    def _chunks(self, enc):
+        buf = bytearray()
+        for line in self.rows:
+            buf += line
+            if len(buf) >= self.size:
+                yield buf
+                buf = bytearray()
+        if buf: yield buf
+
+class BatchWriter:
+    # Rows for one table, kept as COPY text lines and written in one transaction when max_rows, max_bytes or max_age
+    # seconds are reached. Rows that could not be sent because the server is unreachable stay in RAM, or in queue_file
+    # if given, and go first with the next flush, in the order they were added.
+    def __init__(self, host, user, password, database, table, columns=None, port=5432, use_ssl=False, max_rows=100,
+                 max_bytes=4096, max_age=60, retry_after=30, copy=False, queue_file=None, **kwargs):
+        self._connect_args = (host, user, password, database, port, use_ssl)
+        self._connect_kwargs = kwargs
+        self.table, self.columns, self.copy = table, columns, copy
+        self.max_rows, self.max_bytes, self.max_age, self.retry_after = max_rows, max_bytes, max_age, retry_after
+        self.queue_file = queue_file
+        self.conn = None
+        self._buf = bytearray()
+        self._rows = 0
+        self._started = None
+        self._failed = None
+        # Rows waiting in queue_file from an earlier flush or an earlier run
+        self._queued = 0
+        if queue_file:
+            try:
+                with open(queue_file, 'rb') as f:
+                    while True:
+                        chunk = f.read(1024)
+                        if not chunk: break
+                        self._queued += chunk.count(b'\n')
+            except OSError: pass
+        self._counters = {'rows': 0, 'batches': 0, 'failed': 0, 'queued': 0}
+
+    @property
+    def pending(self):
+        # Rows not in the database yet
+        return self._rows + self._queued
+
+    @property
+    def stats(self):
+        return dict(self._counters)
+
+    def add(self, row):
+        if not self._rows: self._started = _now[0]()
+        self._buf += _line(row)
+        self._rows += 1
+        return self.poll()
+
+    def poll(self):
+        # Flushes when a limit is reached or rows wait in queue_file, but not within retry_after seconds of a failed flush.
+        # Call it from the main loop, so that max_age is kept when no rows come in.
+        now = _now[0]()
+        if self._failed is not None and _now[1](now, self._failed) < self.retry_after * 1000: return False
+        if self._queued or self._rows >= self.max_rows or len(self._buf) >= self.max_bytes or \
+           self._rows and _now[1](now, self._started) >= self.max_age * 1000: return self.flush()
+        return not self.pending
+
+    def flush(self):
+        # True when all rows are written. False when the server is unreachable, the rows are kept for the next flush.
+        # Errors of the server (a constraint, a wrong value) are raised and the rows stay buffered, see discard().
+        if not self.pending: return True
+        try:
+            if not self.conn or not self.conn.sock: self.conn = connect(*self._connect_args, **self._connect_kwargs)
+            self.conn.autocommit = False
+            cur = self.conn.cursor()
+            if self._queued: self._send(cur, self._file_lines())
+            self._send(cur, self._buffer_lines())
+            self.conn.commit()
+        except Exception as e:
+            # Only a lost or refused connection (socket errors, SQLSTATE 08 and 57) makes the rows wait
+            self._counters['failed'] += 1
+            if not isinstance(e, OSError) and str(e)[:2] not in ('08', '57'): raise
+            self._failed = _now[0]()
+            self._offline()
+            return False
+        self._failed = None
+        self._counters['rows'] += self.pending
+        self._counters['batches'] += 1
+        self._buf, self._rows, self._started = bytearray(), 0, None
+        if self._queued:
+            open(self.queue_file, 'wb').close()
+            self._queued = 0
+        return True
+
+    def discard(self):
+        # Drops the buffered rows and the queue file, after an error that sending them again would repeat
+        self._buf, self._rows, self._started = bytearray(), 0, None
+        if self._queued:
+            open(self.queue_file, 'wb').close()
+            self._queued = 0
+
+    def close(self):
+        flushed = self.flush()
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+        return flushed
+
+    def _offline(self):
+        # The transaction is lost with the connection, so everything is still pending. Buffered rows move to queue_file.
+        if self.conn:
+            try: self.conn.close()
+            except: pass
+            self.conn = None
+        if self.queue_file and self._rows:
+            with open(self.queue_file, 'ab') as f: f.write(self._buf)
+            self._counters['queued'] += self._rows
+            self._queued += self._rows
+            self._buf, self._rows, self._started = bytearray(), 0, None
+
+    def _file_lines(self):
+        with open(self.queue_file, 'rb') as f:
+            while True:
+                line = f.readline()
+                if not line.endswith(b'\n'): return
+                yield line
+
+    def _buffer_lines(self):
+        start, buf = 0, self._buf
+        while start < len(buf):
+            end = buf.index(b'\n', start) + 1
+            yield buf[start:end]
+            start = end
+
+    def _send(self, cur, lines):
+        columns = ' (%s)' % ', '.join(self.columns) if self.columns else ''
+        if self.copy:
+            _copy_query(cur, 'COPY %s%s FROM STDIN' % (self.table, columns), _Lines(lines, 8192))
+            return
+        # Multi-row INSERT of up to max_rows rows, full batches reuse one prepared statement
+        batch = []
+        for line in lines:
+            batch.append([_unescape(v) for v in str(line[:-1], 'utf-8').split('\t')])
+            if len(batch) >= self.max_rows:
+                self._insert(cur, columns, batch)
+                batch = []
+        if batch: self._insert(cur, columns, batch)
+
+    def _insert(self, cur, columns, batch):
+        row = '(%s)' % ', '.join(['%s'] * len(batch[0]))
+        cur.execute('INSERT INTO %s%s VALUES %s' % (self.table, columns, ', '.join([row] * len(batch))), [v for r in batch for v in r])
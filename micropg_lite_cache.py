@@ -0,0 +1,176 @@
+# Client-side cache of SELECT results for micropg_lite, loaded by connect.cache_results().
+# Part of micropg_lite (MIT License, see micropg_lite.py): https://github.com/TimonW-Dev/micropg_lite
+# Like instrument(), the caching versions of execute(), _execute_prepared() and _execute_many() are only installed on the
+# connection that asked for them.
+
+from micropg_lite import _now
+
+_reads = ('select', 'with', 'values')
+# Statements that change neither tables nor cached results; everything else that is not a known write (DDL, CALL, DO, ...)
+# empties the cache
+_neutral = ('begin', 'start', 'commit', 'end', 'rollback', 'abort', 'savepoint', 'release', 'set', 'reset', 'show', 'explain',
+            'listen', 'unlisten', 'notify', 'fetch', 'move', 'close', 'declare', 'prepare', 'deallocate', 'discard', 'lock', 'analyze')
+_writes = ('insert', 'update', 'delete', 'truncate', 'merge')
+# Words that may stand before ( in a cached SELECT: syntax, types and functions that change nothing and give the same
+# result again. Any other call (nextval(), now(), random(), pg_notify(), functions of your own) and the words in
+# _volatile make the result uncacheable.
+_calls = frozenset(('select', 'from', 'join', 'where', 'on', 'using', 'and', 'or', 'not', 'in', 'exists', 'any', 'all', 'some',
+                    'values', 'as', 'with', 'recursive', 'lateral', 'union', 'intersect', 'except', 'over', 'filter', 'within',
+                    'by', 'when', 'then', 'else', 'case', 'is', 'like', 'ilike', 'between', 'distinct', 'array', 'row', 'limit',
+                    'offset', 'having', 'cast', 'numeric', 'decimal', 'varchar', 'char', 'count', 'sum', 'avg', 'min', 'max',
+                    'coalesce', 'nullif', 'greatest', 'least', 'lower', 'upper', 'length', 'trim', 'substring', 'substr',
+                    'position', 'replace', 'concat', 'split_part', 'left', 'right', 'abs', 'round', 'trunc', 'floor', 'ceil',
+                    'mod', 'power', 'sqrt', 'extract', 'date_part', 'date_trunc', 'to_char', 'array_agg', 'string_agg', 'bool_and',
+                    'bool_or', 'json_agg', 'jsonb_agg', 'row_number', 'rank', 'dense_rank', 'lag', 'lead', ',', '=', '<>', '!=',
+                    '<', '>', '<=', '>=', '+', '-', '*', '/', '||'))
+_volatile = ('current_timestamp', 'current_time', 'current_date', 'localtime', 'localtimestamp')
+_hit = object()
+
+def _statements(query):
+    # Lower-case words of every statement, with ( ) , as words of their own and identifiers without schema and quotes
+    for s in query.lower().split(';'):
+        for c in '(),':
+            s = s.replace(c, ' %s ' % c)
+        words = [w.split('.')[-1].strip('"') for w in s.split()]
+        if words: yield words
+
+def _written(words):
+    # Tables a write statement changes, None if they are not known
+    first, tables = words[0], []
+    if first == 'copy': return words[1:2] if len(words) > 2 and words[1] != '(' and 'from' in words else []
+    if first in ('insert', 'merge', 'delete'): i = 2
+    elif first == 'update': i = 1
+    else: i = 1 + (words[1:2] == ['table'])
+    while i < len(words):
+        if words[i] == 'only': i += 1
+        if i < len(words): tables.append(words[i])
+        if first != 'truncate' or words[i + 1:i + 2] != [',']: break
+        i += 2
+    return tables or None
+
+def _stable(words):
+    # False if the statement calls a function that may change something or answer differently next time
+    for i, w in enumerate(words):
+        if w in _volatile or w == '(' and i and words[i - 1].split('::')[-1] not in _calls: return False
+    return True
+
+def _size(rows):
+    n = 0
+    for row in rows:
+        data = getattr(row, '_data', None)
+        n += 16 + (len(data) if data is not None else sum(len(v) if v.__class__ in (str, bytes) else 8 for v in row))
+    return n
+
+class ResultCache:
+    # Rows and description of SELECTs by SQL text, parameters and row type, least recently used first in _lru.
+    # An entry ends after ttl seconds, or when the connection writes to a table named in its SQL.
+    def __init__(self, ttl=60, max_entries=32, max_bytes=16384):
+        self._entries = {}
+        self._lru = []
+        # Tables written in the open transaction: results that read them are not cached until it ends
+        self._dirty = set()
+        self.size = 0
+        self.hits = self.misses = self.invalidations = 0
+        self.configure(ttl, max_entries, max_bytes)
+
+    def configure(self, ttl=60, max_entries=32, max_bytes=16384):
+        self.ttl, self.max_entries, self.max_bytes = ttl, max_entries, max_bytes
+        self._evict(0, 0)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self.invalidations += len(self._entries)
+        self._entries, self._lru, self.size = {}, [], 0
+
+    def invalidate(self, table=None):
+        # Drops the results that name table, or all of them
+        if table is None: return self.clear()
+        table = table.lower().split('.')[-1].strip('"')
+        for key in [key for key, e in self._entries.items() if table in e[1]]:
+            self._drop(key)
+            self.invalidations += 1
+
+    def _drop(self, key):
+        self.size -= self._entries.pop(key)[5]
+        self._lru.remove(key)
+
+    def _evict(self, size, count):
+        while self._lru and (len(self._lru) + count > self.max_entries or self.size + size > self.max_bytes):
+            self._drop(self._lru[0])
+
+    def begin(self, conn, query, params, obj):
+        # Serves a cached result into obj (returns _hit), or returns the key to store the result under (None: not cacheable)
+        if conn._ready_for_query == b'I': self._dirty.clear()
+        statements = list(_statements(query))
+        read = len(statements) == 1 and statements[0][0] in _reads and _stable(statements[0])
+        for words in statements:
+            first = words[0]
+            if first in _reads:
+                # SELECT ... FOR UPDATE is not cached, a data-modifying WITH may write to any table
+                if any(w in _writes for w in words):
+                    read = False
+                    if first == 'with': self.clear()
+                continue
+            if first in _neutral: continue
+            tables = _written(words) if first in _writes or first == 'copy' else None
+            if tables is None: self.clear()
+            for table in tables or ():
+                self.invalidate(table)
+                if conn._ready_for_query != b'I' or not conn.autocommit: self._dirty.add(table)
+        if not read or params is None or obj is None or obj.stream: return None
+        try:
+            key = (query, tuple(params), obj.lazy)
+            e = self._entries.get(key)
+        except TypeError: return None
+        if e:
+            if _now[1](_now[0](), e[0]) < self.ttl * 1000:
+                self._lru.remove(key)
+                self._lru.append(key)
+                obj.description, obj._decoders, obj._rows, obj._rowcount = e[2], e[3], list(e[4]), len(e[4])
+                obj._completed = 1
+                self.hits += 1
+                return _hit
+            self._drop(key)
+        self.misses += 1
+        return None if self._dirty.intersection(statements[0]) else key
+
+    def store(self, key, obj):
+        # Complete results only: not spooled, nothing left at the server. A simple query has its one result in obj._sets.
+        description, decoders, rows, _, spool = obj._sets[0] if obj._sets else (obj.description, obj._decoders, obj._rows, 0, obj._spool)
+        if description is None or spool is not None or obj._suspended or key in self._entries: return
+        size = _size(rows) + len(key[0])
+        if size > self.max_bytes or not self.max_entries: return
+        self._evict(size, 1)
+        words = set(next(_statements(key[0])))
+        self._entries[key] = (_now[0](), words, description, decoders, list(rows), size)
+        self._lru.append(key)
+        self.size += size
+
+def cache_results(conn, ttl, max_entries, max_bytes):
+    cache = conn.result_cache
+    if cache is not None:
+        cache.configure(ttl, max_entries, max_bytes)
+        return cache
+    cache = conn.result_cache = ResultCache(ttl, max_entries, max_bytes)
+    # AsyncConnection brings a wrapper for its coroutines
+    wrap = getattr(conn, '_cached', None) or (lambda method, many: cached(conn, cache, method, many))
+    for name, many in (('execute', False), ('_execute_prepared', False), ('_execute_many', True)):
+        setattr(conn, name, wrap(getattr(conn, name), many))
+    return cache
+
+def arguments(args, many):
+    # (params, obj) of execute(query, obj=None), _execute_prepared(query, params, obj) and _execute_many(query, seq, obj)
+    obj = args[-1] if args else None
+    return (None if many else args[0] if len(args) > 1 else ()), obj
+
+def cached(conn, cache, method, many):
+    def run(query, *args):
+        params, obj = arguments(args, many)
+        key = cache.begin(conn, query, params, obj)
+        if key is _hit: return
+        result = method(query, *args)
+        if key: cache.store(key, obj)
+        return result
+    return run
@@ -0,0 +1,57 @@
+# Query cancel and query_timeout of micropg_lite, loaded by cancel(), by setting query_timeout and by a read that times out.
+# Part of micropg_lite (MIT License, see micropg_lite.py): https://github.com/TimonW-Dev/micropg_lite
+
+import socket
+from micropg_lite import raiseExceptionLostConnection, _now
+
+def is_timeout(e):
+    # socket.timeout on CPython, ETIMEDOUT or EAGAIN on MicroPython
+    return e.__class__.__name__ in ('timeout', 'TimeoutError') or bool(e.args) and e.args[0] in (11, 110)
+
+def timed_out(conn, e):
+    # A failed read: the first timeout cancels the query and the read goes on, the next one ends the connection
+    if not is_timeout(e): raise e
+    if not conn._cancelled:
+        conn._cancelled = True
+        # The server gets another query_timeout to answer the cancel
+        conn._sent = _now[0]()
+        try: return conn.cancel()
+        except Exception: pass
+    conn.sock.close()
+    conn.sock = None
+    raiseExceptionLostConnection()
+
+def deadline(conn, seconds):
+    # query_timeout counts from the last send, not per read: every read waits only for what is left of it.
+    # _sent is None while nothing is asked, e.g. in wait_for_notify(), then reads wait for the whole query_timeout.
+    sock = conn.sock
+    conn._set_socket(sock)
+    sock.settimeout(seconds)
+    conn._sent = None
+    if not seconds: return
+    recv_into, send, limit = conn._recv_into, conn._send, int(seconds * 1000)
+    def timed_send(b):
+        # A send may wait for the whole query_timeout, the last read may have left a shorter socket timeout
+        conn._sent = _now[0]()
+        sock.settimeout(seconds)
+        return send(b)
+    def timed_recv_into(mv):
+        if conn._sent is None: sock.settimeout(seconds)
+        else:
+            left = limit - _now[1](_now[0](), conn._sent)
+            if left <= 0: raise OSError(110)
+            sock.settimeout(left / 1000)
+        return recv_into(mv)
+    conn._recv_into, conn._send = timed_recv_into, timed_send
+
+def cancel(conn):
+    # CancelRequest on a side connection: the server stops the query the connection runs, which then fails with SQLSTATE 57014
+    if not conn._backend_key: return
+    sock = socket.socket()
+    try:
+        sock.settimeout(10)
+        sock.connect(socket.getaddrinfo(conn.host, conn.port)[0][-1])
+        sock.send((16).to_bytes(4, 'big') + (80877102).to_bytes(4, 'big') + conn._backend_key)
+        # The server closes the side connection once it has passed the request on
+        sock.recv(1)
+    finally: sock.close()
@@ -0,0 +1,102 @@
+# Array and binary-format converters of micropg_lite, loaded by the first result with an array column, the first list or
+# tuple parameter, the first parameters quoted into a statement, or the first statement a connect(binary=True) connection prepares.
+# Part of micropg_lite (MIT License, see micropg_lite.py): https://github.com/TimonW-Dev/micropg_lite
+
+import binascii, struct
+from micropg_lite import decoders, encoders, _array_text
+
+def _array(conv):
+    # Decoder for an array type: text array literal to a (nested) list, elements converted from str with conv
+    def decode(v):
+        s = v.decode('utf-8')
+        if s[0] == '[': s = s[s.index('=') + 1:]
+        stack, i, n = [], 0, len(s)
+        while i < n:
+            c = s[i]
+            if c == '{':
+                stack.append([])
+                i += 1
+            elif c == '}':
+                done = stack.pop()
+                if not stack: return done
+                stack[-1].append(done)
+                i += 1
+            elif c == ',': i += 1
+            elif c == '"':
+                i, e = i + 1, []
+                while s[i] != '"':
+                    if s[i] == '\\': i += 1
+                    e.append(s[i])
+                    i += 1
+                i += 1
+                e = ''.join(e)
+                stack[-1].append(conv(e) if conv else e)
+            else:
+                j = i
+                while s[j] not in ',}': j += 1
+                e = s[i:j]
+                stack[-1].append(None if e == 'NULL' else conv(e) if conv else e)
+                i = j
+    return decode
+
+def array_text(v):
+    # list or tuple to an array literal, nested lists are dimensions
+    return '{' + ','.join('NULL' if e is None else array_text(e) if e.__class__ in (list, tuple) else
+                          '"' + encoders.get(e.__class__, str)(e).replace('\\', '\\\\').replace('"', '\\"') + '"' for e in v) + '}'
+
+def quote(conn, q, a):
+    # %s placeholders of a statement the server cannot bind (see Cursor._parameters()) replaced by literals.
+    # Backslashes are only escape characters with standard_conforming_strings off, which the server reports at login.
+    q = q.split('%s')
+    if len(q) != len(a) + 1: raise Exception('08P01:%d parameters given for %d placeholders' % (len(a), len(q) - 1))
+    escapes = conn.parameters.get('standard_conforming_strings') == 'off'
+    for i, v in enumerate(a):
+        if v is None: v = 'NULL'
+        else:
+            v = v if v.__class__ is str else encoders.get(v.__class__, str)(v)
+            if escapes: v = v.replace('\\', '\\\\')
+            v = "'" + v.replace("'", "''") + "'"
+        q[i + 1] = v + q[i + 1]
+    return ''.join(q)
+
+_day = (None, '', '')
+
+def _timestamp(v):
+    global _day
+    us = struct.unpack('!q', v)[0]
+    if us in (0x7fffffffffffffff, -0x8000000000000000): return 'infinity' if us > 0 else '-infinity'
+    days, us = divmod(us, 86400000000)
+    if days != _day[0]:
+        # Days since 2000-01-01 to a civil date (inverse of Howard Hinnant's days_from_civil), cached per day
+        z = days + 730425
+        era = z // 146097
+        doe = z - era * 146097
+        yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+        doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+        mp = (5 * doy + 2) // 153
+        m = mp + 3 if mp < 10 else mp - 9
+        y = yoe + era * 400 + (m <= 2)
+        _day = (days, '%04d-%02d-%02d' % (y if y > 0 else 1 - y, m, doy - (153 * mp + 2) // 5 + 1), '' if y > 0 else ' BC')
+    s, us = divmod(us, 1000000)
+    r = '%s %02d:%02d:%02d' % (_day[1], s // 3600, s // 60 % 60, s % 60)
+    if us: r += ('.%06d' % us).rstrip('0')
+    return r + _day[2]
+
+# Binary-format decoders, used for these OIDs when connect(binary=True). A struct format is unpacked in place.
+binary_decoders = {
+    16: lambda v: v == b'\x01', 17: bytes, 21: '!h', 23: '!i', 20: '!q', 26: '!I', 700: '!f', 701: '!d', 1114: _timestamp,
+    2950: lambda v: '-'.join(binascii.hexlify(v[a:b]).decode() for a, b in ((0, 4), (4, 6), (6, 8), (8, 10), (10, 16))),
+}
+
+def binary_formats(stmt, obj):
+    # Result formats of a new statement for Bind, and the decoders that go with them
+    if obj.description:
+        fmts = [1 if d[1] in binary_decoders else 0 for d in obj.description]
+        obj._decoders = tuple(binary_decoders[d[1]] if f else decoders.get(d[1]) for d, f in zip(obj.description, fmts))
+        stmt[3] = len(fmts).to_bytes(2, 'big') + b''.join(f.to_bytes(2, 'big') for f in fmts)
+
+# Entries set by the program before this import are kept
+for oid, conv in ((1000, lambda e: e == 't'), (1005, int), (1007, int), (1016, int), (1021, float), (1022, float), (1009, None), (1015, None)):
+    if oid not in decoders: decoders[oid] = _array(conv)
+for t in (list, tuple):
+    if encoders.get(t) is _array_text: encoders[t] = array_text
@@ -0,0 +1,76 @@
+# COPY FROM STDIN / TO STDOUT for micropg_lite, loaded on first use of Cursor.copy_from() or Cursor.copy_to().
+# Part of micropg_lite (MIT License, see micropg_lite.py): https://github.com/TimonW-Dev/micropg_lite
+
+from micropg_lite import encoders
+
+def _copy_text(v):
+    if v is None: return '\\N'
+    t = v.__class__
+    if t is int: return str(v)
+    if t is not str: v = encoders.get(t, str)(v)
+    return v.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+class CopyIn:
+    # Rows for COPY FROM STDIN, sent when the server answers the query with CopyInResponse
+    def __init__(self, rows, size):
+        self.rows, self.size = rows, size
+
+    def _chunks(self, enc):
+        buf = bytearray()
+        for row in self.rows:
+            buf += '\t'.join([_copy_text(v) for v in row]).encode(enc)
+            buf += b'\n'
+            if len(buf) >= self.size:
+                yield buf
+                buf = bytearray()
+        if buf: yield buf
+
+    def send(self, conn):
+        # CopyDone ends the COPY of the simple query; if the row source raises, CopyFail and hand its exception to the caller.
+        # A chunk is sent when the next one is ready, so the last one goes in one write with CopyDone (no Nagle stall).
+        try:
+            for chunk in self._chunks(conn.encoding):
+                conn._flush()
+                conn._send_message(b'd', chunk)
+        except Exception as e:
+            conn._wbuf = bytearray()
+            conn._send_message(b'f', str(e).encode(conn.encoding) + b'\x00')
+            conn._flush()
+            while True:
+                code, data = conn._read_message()
+                if code == 90: break
+            conn._ready_for_query = bytes(data)
+            raise
+        conn._wbuf += b'c\x00\x00\x00\x04'
+        conn._flush()
+
+class CopyOut:
+    # CopyData of COPY TO STDOUT, passed on to sink.write() in chunks of about size bytes
+    def __init__(self, sink, size):
+        self.sink, self.size, self.buf = sink, size, bytearray()
+
+    def write(self, data):
+        self.buf += data
+        if len(self.buf) >= self.size: self.flush()
+
+    def flush(self):
+        if self.buf:
+            self.sink.write(self.buf)
+            self.buf = bytearray()
+
+def from_query(table, columns):
+    return 'COPY %s%s FROM STDIN' % (table, ' (%s)' % ', '.join(columns) if columns else '')
+
+def copy_from(cur, table, rows, columns=None, size=8192):
+    _copy_query(cur, from_query(table, columns), CopyIn(rows, size))
+
+def copy_to(cur, query, sink, size=8192):
+    copy = CopyOut(sink, size)
+    _copy_query(cur, 'COPY (%s) TO STDOUT' % query, copy)
+    copy.flush()
+
+def _copy_query(cur, q, copy):
+    cur._start()
+    cur._copy = copy
+    try: cur.connection.execute(q, cur)
+    finally: cur._copy = None
@@ -0,0 +1,23 @@
+# DatabaseError subclasses of micropg_lite, loaded by the first ErrorResponse of the server or the first use of one of them.
+# Part of micropg_lite (MIT License, see micropg_lite.py): https://github.com/TimonW-Dev/micropg_lite
+
+from micropg_lite import DatabaseError
+
+class DataError(DatabaseError): pass
+class IntegrityError(DatabaseError): pass
+class OperationalError(DatabaseError): pass
+class ProgrammingError(DatabaseError): pass
+
+# DatabaseError subclass by SQLSTATE class (first two characters)
+error_classes = {'22': DataError, '23': IntegrityError, '08': OperationalError, '28': OperationalError, '40': OperationalError,
+                 '53': OperationalError, '57': OperationalError, '58': OperationalError, '42': ProgrammingError}
+
+def database_error(data):
+    # ErrorResponse to the exception to raise, see DatabaseError
+    fields = dict((f[:1], f[1:]) for f in str(data, 'utf-8').split('\x00') if f)
+    e = error_classes.get(fields.get('C', '')[:2], DatabaseError)(fields.get('C', '') + ':' + fields.get('M', ''))
+    e.fields = fields
+    e.sqlstate, e.message, e.severity = fields.get('C', ''), fields.get('M', ''), fields.get('V', fields.get('S'))
+    e.detail, e.hint = fields.get('D'), fields.get('H')
+    e.position = int(fields['P']) if 'P' in fields else None
+    return e
@@ -0,0 +1,40 @@
+# LISTEN/NOTIFY for micropg_lite, loaded on first use of listen(), unlisten() or wait_for_notify().
+# Part of micropg_lite (MIT License, see micropg_lite.py): https://github.com/TimonW-Dev/micropg_lite
+
+import select
+from micropg_lite import raiseExceptionLostConnection, _database_error, _now
+
+def channel_query(conn, command, channel):
+    # The channel is quoted, so its name is case-sensitive: NOTIFY from SQL must quote it too unless it is lower case
+    return (command + (channel if channel == '*' else '"%s"' % channel.replace('"', '""'))).encode(conn.encoding) + b'\x00'
+
+def listen(conn, channel):
+    # Sent without BEGIN: in effect at once, or at COMMIT when a transaction is open
+    conn._send_message(b'Q', channel_query(conn, 'LISTEN ', channel))
+    conn._process_messages(None)
+
+def unlisten(conn, channel):
+    conn._send_message(b'Q', channel_query(conn, 'UNLISTEN ', channel))
+    conn._process_messages(None)
+
+def wait_for_notify(conn, timeout):
+    # Only reads the socket, nothing is sent. The server holds notifications back while a transaction is open.
+    if not conn.sock: raiseExceptionLostConnection()
+    conn._flush()
+    # No query is waiting for an answer, so query_timeout does not apply to these reads
+    conn._sent = None
+    start, poller = _now[0](), select.poll()
+    poller.register(conn.sock, select.POLLIN)
+    pending = getattr(conn.sock, 'pending', None)
+    while not conn.notifies:
+        if conn._rpos == conn._rend and not (pending and pending()):
+            left = -1 if timeout is None else int(timeout * 1000) - _now[1](_now[0](), start)
+            if timeout is not None and left < 0 or not poller.poll(left): return None
+        try: code, data = conn._read_message()
+        except: raiseExceptionLostConnection()
+        if code == 69:
+            conn.sock.close()
+            conn.sock = None
+            raise _database_error(data)
+        if code == 65 or code == 83: conn._unsolicited(code, data)
+    return conn.notifies.pop(0)
@@ -0,0 +1,156 @@
+# ConnectionPool for micropg_lite on CPython, loaded on first use of micropg_lite.ConnectionPool.
+# Part of micropg_lite (MIT License, see micropg_lite.py): https://github.com/TimonW-Dev/micropg_lite
+
+from micropg_lite import connect
+
+class ConnectionPool:
+    # Thread-safe pool of connect objects for CPython. threading is only imported here, so MicroPython never loads it.
+    def __init__(self, host, user, password, database, port=5432, use_ssl=False, min_size=0, max_size=4,
+                 idle_timeout=300, max_lifetime=3600, timeout=30, check_after=30, reset=None, **kwargs):
+        import threading, time
+        self._now = time.monotonic
+        self._cond = threading.Condition()
+        self._connect_args = (host, user, password, database, port, use_ssl)
+        self._connect_kwargs = kwargs
+        self.min_size, self.max_size = min_size, max_size
+        self.idle_timeout, self.max_lifetime, self.timeout = idle_timeout, max_lifetime, timeout
+        # Connections idle longer than check_after seconds get an empty query on checkout, reset is SQL run on return
+        self.check_after, self.reset = check_after, reset
+        # Idle connections as [conn, created, released], most recently released last
+        self._idle = []
+        self._created = {}
+        # ids of the connections handed out and not released yet
+        self._in_use = set()
+        self._closed = False
+        self._counters = {'created': 0, 'closed': 0, 'acquired': 0, 'reused': 0, 'failed_checks': 0, 'waits': 0, 'timeouts': 0}
+        for _ in range(min_size):
+            conn = connect(*self._connect_args, **self._connect_kwargs)
+            self._created[id(conn)] = now = self._now()
+            self._counters['created'] += 1
+            self._idle.append([conn, now, now])
+
+    def _discard(self, conn):
+        self._created.pop(id(conn), None)
+        self._counters['closed'] += 1
+        try: conn.close()
+        except: pass
+
+    def _usable(self, conn, created, released, now):
+        if not conn.sock or conn._ready_for_query != b'I' or now - created > self.max_lifetime: return False
+        if now - released > self.check_after:
+            try:
+                conn._send_message(b'Q', b'\x00')
+                conn._process_messages(None)
+            except:
+                with self._cond: self._counters['failed_checks'] += 1
+                return False
+        return True
+
+    def _prune(self, now):
+        # Drop expired idle connections, oldest first, down to min_size
+        keep = []
+        for item in self._idle:
+            if len(self._created) > self.min_size and (now - item[2] > self.idle_timeout or now - item[1] > self.max_lifetime):
+                self._discard(item[0])
+            else: keep.append(item)
+        self._idle = keep
+
+    def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        deadline = self._now() + timeout
+        while True:
+            # Take an idle connection or reserve a slot for a new one under the lock, talk to the server outside of it
+            with self._cond:
+                while True:
+                    if self._closed: raise Exception('08003:Connection pool is closed')
+                    now = self._now()
+                    self._prune(now)
+                    if self._idle:
+                        item = self._idle.pop()
+                        break
+                    if len(self._created) < self.max_size:
+                        item = object()
+                        self._created[item] = now
+                        break
+                    if now >= deadline:
+                        self._counters['timeouts'] += 1
+                        raise Exception('53300:No pooled connection available within %s seconds' % timeout)
+                    self._counters['waits'] += 1
+                    self._cond.wait(deadline - now)
+            if item.__class__ is object:
+                conn = None
+                try:
+                    conn = connect(*self._connect_args, **self._connect_kwargs)
+                    return conn
+                finally:
+                    with self._cond:
+                        del self._created[item]
+                        if conn:
+                            self._created[id(conn)] = self._now()
+                            self._in_use.add(id(conn))
+                            self._counters['created'] += 1
+                            self._counters['acquired'] += 1
+                        else: self._cond.notify()
+            conn = item[0]
+            if self._usable(conn, item[1], item[2], self._now()):
+                with self._cond:
+                    self._in_use.add(id(conn))
+                    self._counters['acquired'] += 1
+                    self._counters['reused'] += 1
+                return conn
+            with self._cond:
+                self._discard(conn)
+                self._cond.notify()
+
+    def release(self, conn):
+        # Roll back what the borrower left open and restore the connection defaults before anyone else gets it.
+        # A connection released twice could be with the next borrower already, so it is not touched.
+        with self._cond:
+            if id(conn) not in self._in_use: raise ValueError('connection is not checked out from this pool')
+            self._in_use.discard(id(conn))
+        try:
+            if conn.sock and conn._ready_for_query != b'I': conn.rollback()
+            if self.reset:
+                conn.autocommit = True
+                conn.execute(self.reset)
+                if 'DISCARD' in self.reset.upper(): conn._stmt_cache, conn._stmt_lru = {}, []
+            conn.autocommit = False
+            usable = bool(conn.sock)
+        except: usable = False
+        with self._cond:
+            if usable and not self._closed and id(conn) in self._created:
+                self._idle.append([conn, self._created[id(conn)], self._now()])
+            else: self._discard(conn)
+            self._cond.notify()
+
+    def connection(self, timeout=None):
+        return _PooledConnection(self, timeout)
+
+    @property
+    def stats(self):
+        with self._cond:
+            stats = dict(self._counters)
+            stats['size'] = len(self._created)
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = stats['size'] - stats['idle']
+            return stats
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            for item in self._idle: self._discard(item[0])
+            self._idle = []
+            self._cond.notify_all()
+
+class _PooledConnection:
+    # with pool.connection() as conn: ... gives the connection back to the pool on exit
+    def __init__(self, pool, timeout):
+        self.pool, self.timeout, self.conn = pool, timeout, None
+
+    def __enter__(self):
+        self.conn = self.pool.acquire(self.timeout)
+        return self.conn
+
+    def __exit__(self, *exc):
+        self.pool.release(self.conn)
+        self.conn = None
@@ -0,0 +1,130 @@
+# Lazy rows (cursor(lazy=True)) and Cursor.fetch_columns() of micropg_lite, loaded on first use.
+# Rows read back from a spool file are built here as well.
+# Part of micropg_lite (MIT License, see micropg_lite.py): https://github.com/TimonW-Dev/micropg_lite
+
+import struct, array
+
+# array typecodes for Cursor.fetch_columns() by type OID, columns of other types are lists
+column_types = {20: 'q', 21: 'q', 23: 'q', 26: 'q', 700: 'd', 701: 'd'}
+
+_unread = object()
+
+class Row:
+    # DataRow kept as received, a column is decoded on first access by index or by name from the cursor description.
+    # _plan is shared by all rows of a result, see plan().
+    __slots__ = ('_plan', '_data', '_offsets', '_values')
+
+    def __init__(self, plan, data):
+        self._plan, self._data, self._offsets, self._values = plan, data, None, None
+
+    def __getitem__(self, i):
+        if i.__class__ is str: i = self._plan[1][i]
+        elif i.__class__ is slice: return tuple(self)[i]
+        count = len(self._plan[0])
+        if i < 0: i += count
+        if not 0 <= i < count: raise IndexError('column index out of range')
+        if self._values is None: self._offsets, self._values = array.array('i', [2]), [_unread] * count
+        v = self._values[i]
+        if v is _unread:
+            # Offsets of the length fields are only walked as far as the columns read so far
+            data, offsets = self._data, self._offsets
+            while len(offsets) <= i:
+                n = offsets[-1]
+                ln = struct.unpack_from('!i', data, n)[0]
+                offsets.append(n + 4 + (ln if ln > 0 else 0))
+            n = offsets[i]
+            ln = struct.unpack_from('!i', data, n)[0]
+            conv = self._plan[0][i]
+            if ln < 0: v = None
+            elif conv.__class__ is str: v = struct.unpack_from(conv, data, n + 4)[0]
+            elif conv: v = conv(data[n + 4:n + 4 + ln])
+            else: v = data[n + 4:n + 4 + ln].decode(self._plan[2])
+            self._values[i] = v
+        return v
+
+    def _decode(self):
+        # All columns in one pass over the row, for iteration and comparison
+        if self._values is not None and _unread not in self._values: return self._values
+        data, n, row, enc = self._data, 2, [], self._plan[2]
+        for conv in self._plan[0]:
+            ln = struct.unpack_from('!i', data, n)[0]
+            n += 4
+            if ln < 0: row.append(None)
+            elif conv.__class__ is str:
+                row.append(struct.unpack_from(conv, data, n)[0])
+                n += ln
+            else:
+                v = data[n:n+ln]
+                n += ln
+                row.append(conv(v) if conv else v.decode(enc))
+        self._values = row
+        return row
+
+    def __len__(self):
+        return len(self._plan[0])
+
+    def __iter__(self):
+        return iter(self._decode())
+
+    def __eq__(self, other):
+        return tuple(self._decode()) == (tuple(other) if isinstance(other, Row) else other)
+
+    def __hash__(self):
+        return hash(tuple(self._decode()))
+
+    def __repr__(self):
+        return 'Row' + repr(tuple(self._decode()))
+
+def _tuple(plan, data):
+    return tuple(Row(plan, data)._decode())
+
+def plan(cur):
+    # Shared by all rows of a result: (decoders, column index by name, encoding, row builder)
+    return (cur._decoders, dict((d[0], i) for i, d in enumerate(cur.description)), cur.connection.encoding, Row if cur.lazy else _tuple)
+
+def columns_start(cur):
+    cur._columns = ([array.array(column_types[d[1]]) if d[1] in column_types else [] for d in cur.description or ()], [bytearray() for _ in cur.description or ()])
+    cur._column_rows = 0
+    rows = cur._rows[cur._pos:] if cur._pos else cur._rows
+    if cur._spool:
+        import micropg_lite_spool
+        rows = rows + micropg_lite_spool.rest(cur)
+    cur._rows, cur._pos = [], 0
+    for row in rows:
+        if isinstance(row, Row): _column_row(cur, row._data)
+        else:
+            columns, nulls = cur._columns
+            r = cur._column_rows
+            for i, v in enumerate(row):
+                if not r & 7: nulls[i].append(0)
+                if v is None:
+                    nulls[i][r >> 3] |= 1 << (r & 7)
+                    v = None if columns[i].__class__ is list else 0
+                columns[i].append(v)
+            cur._column_rows = r + 1
+    # Rows still at the server (stream cursors) are decoded straight into the columns
+    cur._collect = lambda data: _column_row(cur, data)
+
+def columns_end(cur):
+    columns, cur._columns = cur._columns, None
+    cur._collect = cur._collector()
+    return columns
+
+def _column_row(cur, data):
+    columns, nulls = cur._columns
+    data, n, r, enc = bytes(data), 2, cur._column_rows, cur.connection.encoding
+    for i, conv in enumerate(cur._decoders):
+        if not r & 7: nulls[i].append(0)
+        ln = struct.unpack_from('!i', data, n)[0]
+        n += 4
+        if ln < 0:
+            nulls[i][r >> 3] |= 1 << (r & 7)
+            columns[i].append(None if columns[i].__class__ is list else 0)
+        elif conv.__class__ is str:
+            columns[i].append(struct.unpack_from(conv, data, n)[0])
+            n += ln
+        else:
+            v = data[n:n+ln]
+            n += ln
+            columns[i].append(conv(v) if conv else v.decode(enc))
+    cur._column_rows = r + 1
@@ -0,0 +1,98 @@
+# SCRAM-SHA-256 login for micropg_lite, loaded when the server asks for it.
+# Part of micropg_lite (MIT License, see micropg_lite.py): https://github.com/TimonW-Dev/micropg_lite
+
+import hashlib, binascii, random
+
+def _hmac_pads(key):
+    # Inner and outer padded HMAC-SHA-256 keys, keys longer than the 64 byte block are hashed first
+    if len(key) > 64: key = hashlib.sha256(key).digest()
+    key += bytes(64 - len(key))
+    return bytes(b ^ 0x36 for b in key), bytes(b ^ 0x5c for b in key)
+
+def hmac_sha256_digest(key, msg):
+    ipad, opad = _hmac_pads(key)
+    return hashlib.sha256(opad + hashlib.sha256(ipad + msg).digest()).digest()
+
+def salted_password(password, salt, iterations):
+    # PBKDF2-HMAC-SHA-256 (one 32 byte block) for SCRAM, in C where hashlib has it
+    if hasattr(hashlib, 'pbkdf2_hmac'): return hashlib.pbkdf2_hmac('sha256', password, salt, iterations)
+    ipad, opad = _hmac_pads(password)
+    sha, u = hashlib.sha256, salt + b'\x00\x00\x00\x01'
+    inner, outer = sha(ipad), sha(opad)
+    result = 0
+    if hasattr(inner, 'copy'):
+        # Hash the padded keys once and continue from copies of those states
+        for _ in range(iterations):
+            h = inner.copy()
+            h.update(u)
+            h2 = outer.copy()
+            h2.update(h.digest())
+            u = h2.digest()
+            result ^= int.from_bytes(u, 'big')
+    else:
+        for _ in range(iterations):
+            u = sha(opad + sha(ipad + u).digest()).digest()
+            result ^= int.from_bytes(u, 'big')
+    return result.to_bytes(32, 'big')
+
+# SCRAM keys (password fingerprint, ClientKey, ServerKey) by (host, user, salt, iterations), one dict per connect(scram_cache=...) value.
+# The fingerprint is a fast hash of the password, so it stays in RAM: entries read from the file have None there.
+_scram_caches = {}
+
+def _scram_cache(name):
+    # name is True for memory only or the path of a file with one tab separated entry per line
+    cache = _scram_caches.get(name)
+    if cache is None:
+        cache = _scram_caches[name] = {}
+        if name is not True:
+            try:
+                with open(name) as f:
+                    for line in f:
+                        v = line.rstrip('\n').split('\t')
+                        # Lines of older versions have the fingerprint in front of the keys, it is dropped
+                        if len(v) in (6, 7): cache[v[0], v[1], v[2], int(v[3])] = (None,) + tuple(binascii.unhexlify(k) for k in v[-2:])
+            except OSError: pass
+    return cache
+
+def _save_scram_cache(name, cache):
+    with open(name, 'w') as f:
+        for k, keys in cache.items():
+            f.write('\t'.join([k[0], k[1], k[2], str(k[3])] + [binascii.hexlify(key).decode() for key in keys[1:]]) + '\n')
+
+def authenticate(conn, kind, data):
+    # One step per Authentication message: 10 SASL start, 11 SASL continue, 12 SASL final
+    if kind == 10:
+        if b'SCRAM-SHA-256\x00' not in bytes(data): raise Exception('28000:No supported SASL mechanism')
+        conn._nonce = str(random.getrandbits(32))
+        # Set until SASLFinal has checked the server signature, AuthenticationOk before that is refused
+        conn._scram = ()
+        first = f'n,,n=,r={conn._nonce}'.encode('utf-8')
+        conn._send_message(b'p', b'SCRAM-SHA-256\x00' + (len(first)).to_bytes(4, 'big') + first)
+    elif kind == 11:
+        server = dict(kv.split('=', 1) for kv in str(data, 'utf-8').split(','))
+        password, salt, iterations = conn.password.encode('utf-8'), binascii.a2b_base64(server['s']), int(server['i'])
+        # The derived keys are only taken from the cache for the same password (or, from the file, for the same salt, which the
+        # server renews with every password change), and only stored once the server has proven it knows them
+        cache = _scram_cache(conn.scram_cache) if conn.scram_cache else None
+        key = (conn.host, conn.user, server['s'], iterations)
+        fingerprint = hashlib.sha256(salt + password).digest()
+        keys = cache.get(key) if cache else None
+        if keys and keys[0] is None: keys = (fingerprint,) + keys[1:]
+        elif not keys or keys[0] != fingerprint:
+            salted = salted_password(password, salt, iterations)
+            keys = (fingerprint, hmac_sha256_digest(salted, b"Client Key"), hmac_sha256_digest(salted, b"Server Key"))
+        auth_msg = f"n=,r={conn._nonce},r={server['r']},s={server['s']},i={server['i']},c=biws,r={server['r']}".encode('utf-8')
+        conn._scram = (cache, key, keys, auth_msg)
+        proof = binascii.b2a_base64(bytes(x ^ y for x, y in zip(keys[1], hmac_sha256_digest(hashlib.sha256(keys[1]).digest(), auth_msg)))).rstrip(b'\n')
+        conn._send_message(b'p', f"c=biws,r={server['r']},p={proof.decode('utf-8')}".encode('utf-8'))
+    else:
+        if not getattr(conn, '_scram', None): raise Exception('28000:SASLFinal before the SCRAM exchange')
+        cache, key, keys, auth_msg = conn._scram
+        conn._scram = None
+        server = dict(kv.split('=', 1) for kv in str(data, 'utf-8').split(','))
+        if binascii.a2b_base64(server.get('v', '')) != hmac_sha256_digest(keys[2], auth_msg):
+            if cache and cache.pop(key, None) and conn.scram_cache is not True: _save_scram_cache(conn.scram_cache, cache)
+            raise Exception('28000:Invalid SCRAM server signature')
+        if cache is not None and cache.get(key) != keys:
+            old, cache[key] = cache.get(key), keys
+            if conn.scram_cache is not True and (not old or old[1:] != keys[1:]): _save_scram_cache(conn.scram_cache, cache)
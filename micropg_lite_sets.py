@@ -0,0 +1,20 @@
+# Result sets of a simple query with several statements (execute_batch() and nextset()), loaded when the output of a
+# second statement arrives.
+# Part of micropg_lite (MIT License, see micropg_lite.py): https://github.com/TimonW-Dev/micropg_lite
+
+def end_set(cur):
+    # The output of the next statement begins, the result so far waits in _sets as (description, decoders, rows, rowcount, spool)
+    cur._sets.append((cur.description, cur._decoders, cur._rows, cur._rowcount, cur._spool))
+    cur.description, cur._decoders, cur._rows, cur._rowcount = None, None, [], -1
+    cur._spool, cur._spooled, cur._plan = None, 0, None
+
+def first(cur):
+    # After the query: the last result joins the others and the cursor moves to the first one
+    end_set(cur)
+    nextset(cur)
+
+def nextset(cur):
+    cur._spool_close()
+    cur.description, cur._decoders, cur._rows, cur._rowcount, cur._spool = cur._sets.pop(0)
+    cur._pos, cur._plan = 0, None
+    return True
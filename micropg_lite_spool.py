@@ -0,0 +1,75 @@
+# Result spool of micropg_lite, loaded by the first query of a cursor(spool=...).
+# Part of micropg_lite (MIT License, see micropg_lite.py): https://github.com/TimonW-Dev/micropg_lite
+
+import array
+
+class Spool:
+    # Raw DataRows in a file and the start offset of every row in RAM, written and read back in blocks of about 4 KB
+    def __init__(self, path):
+        self.path, self.file = path, open(path, 'w+b')
+        self.offsets, self.size, self.buf = array.array('I'), 0, bytearray()
+        # Decoded rows of the last block read: (first row, rows)
+        self.ahead = None
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def append(self, data):
+        self.offsets.append(self.size + len(self.buf))
+        self.buf += data
+        if len(self.buf) >= 4096: self._write()
+
+    def _write(self):
+        self.file.write(self.buf)
+        self.size += len(self.buf)
+        self.buf = bytearray()
+
+    def read(self, i, n):
+        # Raw DataRows i to i + n - 1 with one seek and one read
+        if self.buf: self._write()
+        offsets, rows = self.offsets, []
+        end = offsets[i + n] if i + n < len(offsets) else self.size
+        self.file.seek(offsets[i])
+        data = self.file.read(end - offsets[i])
+        for k in range(i, i + n):
+            rows.append(data[offsets[k] - offsets[i]:(offsets[k + 1] if k + 1 < i + n else end) - offsets[i]])
+        return rows
+
+    def row(self, i, convert):
+        # Row i as convert(DataRow) from the block around it
+        ahead, offsets = self.ahead, self.offsets
+        if not ahead or not ahead[0] <= i < ahead[0] + len(ahead[1]):
+            n = 1
+            while i + n < len(offsets) and offsets[i + n] - offsets[i] < 4096: n += 1
+            ahead = self.ahead = (i, [convert(data) for data in self.read(i, n)])
+        return ahead[1][i - ahead[0]]
+
+    def close(self):
+        import os
+        self.file.close()
+        os.remove(self.path)
+
+def collect(cur, data):
+    # DataRow of a spool cursor: the rows of the first spool_after bytes stay in RAM, the rest goes to the file
+    if cur._spool is None:
+        if cur._spooled < cur.spool_after:
+            cur._spooled += len(data)
+            cur._rows.append(cur._row(bytes(data)))
+            return
+        # Further statements of a simple query spool to files of their own
+        cur._spool = Spool('%s.%d' % (cur.spool, len(cur._sets)) if cur._sets else cur.spool)
+    cur._spool.append(data)
+
+def fetchone(cur):
+    # Next row once the ones in RAM are fetched
+    i = cur._pos - len(cur._rows)
+    if i >= len(cur._spool): return None
+    cur._pos += 1
+    return cur._spool.row(i, cur._row)
+
+def rest(cur):
+    # Rows not fetched yet, the file is removed
+    i = max(cur._pos - len(cur._rows), 0)
+    rows = [cur._row(data) for data in cur._spool.read(i, len(cur._spool) - i)] if i < len(cur._spool) else []
+    cur._spool_close()
+    return rows
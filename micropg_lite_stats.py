@@ -0,0 +1,66 @@
+# Traffic counters and query callbacks for micropg_lite, loaded by connect.instrument().
+# Part of micropg_lite (MIT License, see micropg_lite.py): https://github.com/TimonW-Dev/micropg_lite
+# The counting versions of the methods below are only installed on the instrumented connection, so a connection
+# without instrument() pays nothing.
+
+import time
+
+_clock = (time.ticks_us, time.ticks_diff) if hasattr(time, 'ticks_us') else (lambda: time.perf_counter_ns() // 1000, lambda a, b: a - b)
+
+def instrument(conn, on_query_start=None, on_query_end=None):
+    conn.on_query_start, conn.on_query_end = on_query_start, on_query_end
+    if conn._counters: return
+    counters = conn._counters = dict.fromkeys(('queries', 'errors', 'time_us', 'rows', 'bytes_sent', 'bytes_received', 'messages', 'round_trips'), 0)
+    write, read_message, waiting = conn._write, conn._read_message, [False]
+    def counted_write(b):
+        counters['bytes_sent'] += len(b)
+        waiting[0] = True
+        write(b)
+    def counted_read_message():
+        # The first message after a write ends a round trip
+        code, data = read_message()
+        if waiting[0]:
+            counters['round_trips'] += 1
+            waiting[0] = False
+        counters['messages'] += 1
+        counters['bytes_received'] += 5 + len(data)
+        if code == 68: counters['rows'] += 1
+        return code, data
+    conn._write, conn._read_message = counted_write, counted_read_message
+    # AsyncConnection brings a wrapper for its coroutines
+    wrap = getattr(conn, '_traced', None) or (lambda method, sql: traced(conn, method, sql))
+    for name, sql in (('execute', None), ('_execute_prepared', None), ('_execute_many', None), ('commit', 'COMMIT'), ('rollback', 'ROLLBACK')):
+        setattr(conn, name, wrap(getattr(conn, name), sql))
+
+def skip(conn, sql):
+    # Statements run by a traced one (the COMMIT of an autocommit executemany()) belong to it, and commit()/rollback() without a transaction send nothing
+    return conn._tracing or (sql and (not conn.sock or conn._ready_for_query == b'I'))
+
+def traced(conn, method, sql):
+    def run(*args):
+        if skip(conn, sql): return method(*args)
+        start = trace_start(conn, sql or args[0])
+        try: result = method(*args)
+        except Exception as e:
+            trace_end(conn, start, e)
+            raise
+        trace_end(conn, start, None)
+        return result
+    return run
+
+def trace_start(conn, sql):
+    if conn.on_query_start: conn.on_query_start(sql)
+    conn._tracing = True
+    return sql, dict(conn._counters), _clock[0]()
+
+def trace_end(conn, start, error):
+    sql, before, ticks = start
+    conn._tracing = False
+    counters = conn._counters
+    counters['time_us'] += _clock[1](_clock[0](), ticks)
+    counters['queries'] += 1
+    if error: counters['errors'] += 1
+    if conn.on_query_end:
+        info = dict((k, counters[k] - before[k]) for k in ('time_us', 'rows', 'bytes_sent', 'bytes_received', 'messages', 'round_trips'))
+        info['sql'], info['error'] = sql, error
+        conn.on_query_end(info)
@@ -0,0 +1,113 @@
+# Prepared statements and their cache for micropg_lite, loaded by the first prepared statement: queries with parameters, executemany(),
+# stream cursors and connect(binary=True).
+# Part of micropg_lite (MIT License, see micropg_lite.py): https://github.com/TimonW-Dev/micropg_lite
+
+from micropg_lite import DatabaseError, encoders
+
+def parse(conn, query, obj):
+    # (stmt, new): the cached statement of the query, or Parse and Describe of a new one, which may push out the least recently used
+    stmt = conn._stmt_cache.pop(query, None)
+    if stmt:
+        conn._stmt_lru.remove(query)
+        obj.description, obj._decoders = stmt[1], stmt[2]
+        obj._parsed = True
+        return stmt, False
+    stmt = [b'', None, None, b'\x00\x00']
+    if conn.stmt_cache_size:
+        if len(conn._stmt_lru) >= conn.stmt_cache_size:
+            conn._send_message(b'C', b'S' + conn._stmt_cache.pop(conn._stmt_lru.pop(0))[0] + b'\x00')
+        conn._stmt_seq += 1
+        stmt[0] = ('s%d' % conn._stmt_seq).encode('ascii')
+    conn._send_message(b'P', stmt[0] + b'\x00' + query.encode(conn.encoding) + b'\x00\x00\x00')
+    conn._send_message(b'D', b'S' + stmt[0] + b'\x00')
+    return stmt, True
+
+def keep(conn, query, stmt, obj):
+    # Only statements the server has parsed, a failed execution leaves them prepared
+    if stmt[0] and obj._parsed:
+        stmt[1], stmt[2] = obj.description, obj._decoders
+        conn._stmt_cache[query] = stmt
+        conn._stmt_lru.append(query)
+
+def stale(conn, stmt, obj, e):
+    # A cached statement the server no longer has (26000, after DISCARD ALL or DEALLOCATE) or whose result type has
+    # changed (0A000, after ALTER TABLE) is closed and not cached again, so the next call parses it anew
+    if stmt[0] and e.sqlstate in ('0A000', '26000'):
+        conn._send_message(b'C', b'S' + stmt[0] + b'\x00')
+        obj._parsed = False
+
+def prepare(conn, query, obj):
+    stmt, new = parse(conn, query, obj)
+    if new and conn.binary:
+        # Result formats go into Bind, so the column types are needed before it is sent.
+        # Sync rather than Flush: the server answers an error in Parse only after a Sync.
+        conn._send_message(b'S', b'')
+        conn._process_messages(obj)
+        import micropg_lite_codecs
+        micropg_lite_codecs.binary_formats(stmt, obj)
+    return stmt
+
+def bind_values(conn, params):
+    # Parameter part of a Bind message: bytes go out in binary format, everything else as text from encoders for the server to cast
+    fmts, vals, enc = bytearray(), bytearray(), conn.encoding
+    for v in params:
+        t = v.__class__
+        if v is None:
+            fmts += b'\x00\x00'
+            vals += b'\xff\xff\xff\xff'
+            continue
+        if t is bytes or t is bytearray: fmts += b'\x00\x01'
+        else:
+            fmts += b'\x00\x00'
+            v = (v if t is str else encoders.get(t, str)(v)).encode(enc)
+        vals += len(v).to_bytes(4, 'big')
+        vals += v
+    n = len(params).to_bytes(2, 'big')
+    return n + fmts + n + vals
+
+def send_bind(conn, portal, stmt, values, result_formats=b'\x00\x00'):
+    conn._send_message(b'B', portal + b'\x00' + stmt + b'\x00' + values + result_formats)
+
+def execute_prepared(conn, query, params, obj):
+    # Parameters are encoded before anything is queued, so one that cannot be encoded leaves no message behind
+    values = bind_values(conn, params)
+    commit = conn._begin(obj.stream and obj)
+    stmt = prepare(conn, query, obj)
+    # Streaming cursors use a named portal inside the transaction, so it survives the Sync after every batch
+    if obj.stream: conn._send_message(b'C', b'P' + obj._portal + b'\x00')
+    send_bind(conn, obj._portal if obj.stream else b'', stmt[0], values, stmt[3])
+    try: conn._fetch_portal(obj)
+    except DatabaseError as e:
+        stale(conn, stmt, obj, e)
+        raise
+    finally: keep(conn, query, stmt, obj)
+    # A stream cursor commits when its portal is done, see connect._fetch_portal()
+    if commit and not obj.stream: conn.commit()
+
+def execute_many(conn, query, seq, obj):
+    # Bind/Execute for every parameter set behind one Parse, with a Sync only when the send buffer gets large
+    commit = conn._begin(True)
+    stmt = prepare(conn, query, obj)
+    try:
+        try:
+            for params in seq:
+                send_bind(conn, b'', stmt[0], bind_values(conn, params), stmt[3])
+                conn._send_message(b'E', b'\x00\x00\x00\x00\x00')
+                if len(conn._wbuf) >= 8192:
+                    conn._send_message(b'S', b'')
+                    conn._process_messages(obj)
+        except:
+            # A parameter set that could not be encoded, or seq itself failed: the messages queued so far still get
+            # their Sync, then the transaction is rolled back, as after an error of the server
+            if conn._wbuf and conn.sock:
+                conn._send_message(b'S', b'')
+                conn._process_messages(obj)
+                conn.rollback()
+            raise
+        conn._send_message(b'S', b'')
+        conn._process_messages(obj)
+    except DatabaseError as e:
+        stale(conn, stmt, obj, e)
+        raise
+    finally: keep(conn, query, stmt, obj)
+    if commit: conn.commit()